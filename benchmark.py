@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Benchmark the blog pipeline on synthetic Blogger exports
+- Generates Atom exports shaped like blog-export.xml: Korean and English
+  text, labels, drafts and pages, inline data:image payloads, remote images,
+  code blocks and nested formatting
+- Times parse_blogspot_xml, generate_blog_files (cold and incremental),
+  clean_blog_posts.main, generate_blog_index.main and build_search_index
+  for each size
+- Each size runs in a fresh process in a scratch directory. On Linux the
+  peak RSS is reset before every stage, so each stage reports its own peak;
+  elsewhere it is the process peak so far
+- A size whose process dies (e.g. killed for running out of memory) is
+  reported with the stage it was in, and the run exits 1
+Results are written as JSON; --compare against an earlier file to spot
+regressions between versions.
+"""
+
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+SIZES = (100, 1000, 10000, 100000)
+RESULTS_PATH = 'benchmark-results.json'
+RESULTS_VERSION = 3
+# A stage counts as regressed when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 0.10
+
+BLOG_ID = '1999:blog-1000000000000000000'
+LABELS = ['Paper Review', 'Book Summary', 'Speech Technology', 'Algorithm', 'Aesthetics',
+          'NLP', 'Python Code', 'Linguistics', 'Data Science', 'Tutorial', 'Research']
+EXCLUDED_LABEL = 'AI Ethics'
+ENGLISH_WORDS = ('model language speech vector attention layer corpus phoneme token '
+                 'training data network semantic syntax review chapter summary theory '
+                 'signal feature entropy python graph tree search matrix').split()
+REMOTE_IMAGE = 'https://blogger.googleusercontent.com/img/b/R29vZ2xl/{}/s320/{}.jpg'
+
+def korean_word(rng):
+    """A run of 1-4 random Hangul syllables"""
+    return ''.join(chr(rng.randint(0xAC00, 0xD7A3)) for _ in range(rng.randint(1, 4)))
+
+def sentence(rng, korean):
+    words = [korean_word(rng) if korean and rng.random() < 0.7 else rng.choice(ENGLISH_WORDS)
+             for _ in range(rng.randint(6, 18))]
+    return ' '.join(words).capitalize() + '.'
+
+def synthetic_content(rng, post_number):
+    """Post body HTML with the kinds of markup Blogger exports contain"""
+    korean = rng.random() < 0.5
+    parts = []
+    for paragraph in range(rng.randint(3, 12)):
+        text = ' '.join(sentence(rng, korean) for _ in range(rng.randint(1, 5)))
+        kind = rng.random()
+        if kind < 0.3:
+            words = text.split(' ')
+            cut = len(words) // 2
+            text = (f"{' '.join(words[:cut])} <b><i>{rng.choice(ENGLISH_WORDS)}</i></b> "
+                    f"<strong><em><span style=\"color: red;\">{' '.join(words[cut:])}</span></em></strong>")
+        parts.append(f'<p><span style="font-family: helvetica; font-size: 14px;">{text}</span></p>')
+        if kind > 0.9:
+            parts.append(f'<blockquote><blockquote><p>{sentence(rng, korean)}</p></blockquote></blockquote>')
+        elif kind > 0.8:
+            parts.append('<pre><code>def f(x):\n    return x  * 2\n</code></pre>')
+        elif kind > 0.7:
+            url = REMOTE_IMAGE.format(f'post{post_number}', paragraph)
+            parts.append(f'<div class="separator" style="clear: both; text-align: center;">'
+                         f'<a href="{url}"><img border="0" height="240" src="{url}" width="320" /></a></div>')
+    if rng.random() < 0.2:
+        # Shared payloads exercise the content-addressed asset store
+        payload = bytes(rng.randrange(256) for _ in range(rng.choice((256, 1024, 4096))))
+        if rng.random() < 0.5:
+            payload = b'shared-image' * 32
+        parts.append(f'<p><img src="data:image/png;base64,{base64.b64encode(payload).decode()}"></p>')
+    return '\n'.join(parts)
+
+def iter_entry(rng, number, start):
+    """Yield the XML of one <entry>"""
+    labels = rng.sample(LABELS, rng.randint(1, 3))
+    if rng.random() < 0.05:
+        labels.append(EXCLUDED_LABEL)
+    kind = 'PAGE' if rng.random() < 0.02 else 'POST'
+    status = 'DRAFT' if rng.random() < 0.05 else 'LIVE'
+    published = start + timedelta(minutes=rng.randrange(60 * 24 * 365 * 10))
+    updated = published + timedelta(days=rng.randrange(400)) if rng.random() < 0.3 else published
+    prefix = f'[{labels[0]} - {rng.choice(LABELS)}] ' if rng.random() < 0.4 else ''
+    korean_title = rng.random() < 0.4
+    title = prefix + ' '.join(korean_word(rng) if korean_title else rng.choice(ENGLISH_WORDS)
+                              for _ in range(rng.randint(3, 8))) + f' {number}'
+
+    yield '  <entry>\n'
+    yield f'    <id>tag:blogger.com,{BLOG_ID}.post-{number}</id>\n'
+    yield f'    <blogger:type>{kind}</blogger:type>\n'
+    yield f'    <blogger:status>{status}</blogger:status>\n'
+    yield f'    <title>{escape(title)}</title>\n'
+    yield f'    <content type=\'html\'>{escape(synthetic_content(rng, number))}</content>\n'
+    yield f'    <published>{published.isoformat(timespec="milliseconds").replace("+00:00", "Z")}</published>\n'
+    yield f'    <updated>{updated.isoformat(timespec="milliseconds").replace("+00:00", "Z")}</updated>\n'
+    for label in labels:
+        yield f'    <category scheme={quoteattr("tag:blogger.com," + BLOG_ID)} term={quoteattr(label)}/>\n'
+    yield '  </entry>\n'
+
+def generate_export(path, posts, seed=0):
+    """Write a synthetic export with the given number of entries; returns its size"""
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write("<feed xmlns='http://www.w3.org/2005/Atom' "
+                "xmlns:blogger='http://schemas.google.com/blogger/2018'>\n")
+        f.write(f'  <id>tag:blogger.com,{BLOG_ID}</id>\n')
+        f.write('  <title>Synthetic benchmark blog</title>\n')
+        for number in range(posts):
+            f.writelines(iter_entry(rng, number, start))
+        f.write('</feed>\n')
+    return os.path.getsize(path)
+
+def max_rss_kb():
+    """Peak resident set size of this process so far, in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def reset_peak_rss():
+    """Restart the peak RSS count at the current RSS; False where only Linux can"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def report(line):
+    """Send one JSON line to the parent process as soon as it is known"""
+    print(json.dumps(line), flush=True)
+
+def timed(stages, name, func, *args, **kwargs):
+    """Run func, recording wall time, CPU time and peak RSS under name
+
+    The parent is told when the stage starts and ends, so a process killed
+    during it is blamed on the right stage and earlier stages are kept.
+    """
+    report({'stage': name})
+    per_stage = reset_peak_rss()
+    wall, cpu = time.perf_counter(), time.process_time()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        result = func(*args, **kwargs)
+    stages[name] = {
+        'wall_s': round(time.perf_counter() - wall, 4),
+        'cpu_s': round(time.process_time() - cpu, 4),
+        'peak_rss_kb': max_rss_kb(),
+        'peak_rss_scope': 'stage' if per_stage else 'process'
+    }
+    report({'stage': name, 'done': stages[name]})
+    return result
+
+def run_size(posts, seed=0):
+    """Benchmark every stage on one synthetic export (in the current directory)"""
+    # Imported here so the parent process stays small and import cost is not timed
+    import blogspot_to_html
+    import clean_blog_posts
+    import generate_blog_index
+    import search_index
+
+    stages = {}
+    export_bytes = timed(stages, 'generate_export', generate_export, 'export.xml', posts, seed)
+    parsed = timed(stages, 'parse_blogspot_xml', blogspot_to_html.parse_blogspot_xml, 'export.xml')
+
+    def convert():
+        return blogspot_to_html.generate_blog_files(
+            parsed, manifest_path=blogspot_to_html.MANIFEST_PATH,
+            index_path=generate_blog_index.POST_INDEX_PATH,
+            stages=clean_blog_posts.CLEAN_STAGES)
+
+    timed(stages, 'generate_blog_files', convert)
+    timed(stages, 'generate_blog_files_incremental', convert)
+
+    # The entry points read their options from sys.argv
+    argv = sys.argv
+    try:
+        sys.argv = ['clean_blog_posts.py']
+        timed(stages, 'clean_blog_posts.main', clean_blog_posts.main)
+        sys.argv = ['generate_blog_index.py', '--no-search']
+        timed(stages, 'generate_blog_index.main --no-search', generate_blog_index.main)
+    finally:
+        sys.argv = argv
+
+    # Timed on its own so its time and memory are not charged to the pages
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        all_posts, _ = generate_blog_index.categorize_posts()
+    timed(stages, 'search_index.build_search_index', search_index.build_search_index, all_posts)
+
+    return {'posts': posts, 'live_posts': len(parsed), 'export_bytes': export_bytes, 'stages': stages}
+
+class SizeFailed(Exception):
+    """The process benchmarking one size exited without a result"""
+
+def describe_exit(returncode):
+    if returncode < 0:
+        try:
+            name = signal.Signals(-returncode).name
+        except ValueError:
+            name = f'signal {-returncode}'
+        hint = ' (most likely out of memory)' if -returncode == signal.SIGKILL else ''
+        return f'killed by {name}{hint}'
+    return f'exit status {returncode}'
+
+def print_stage(name, stage):
+    scope = 'stage' if stage['peak_rss_scope'] == 'stage' else 'so far'
+    print(f"  {name:<38} {stage['wall_s']:>9.3f}s wall {stage['cpu_s']:>9.3f}s cpu "
+          f"{stage['peak_rss_kb'] / 1024:>8.1f} MiB peak ({scope})", flush=True)
+
+def run_in_subprocess(posts, seed=0, keep=False):
+    """Run one size in a fresh interpreter inside a scratch directory
+
+    Stages are printed as they finish. Raises SizeFailed, naming the stage
+    that was running, if the process dies before reporting its result.
+    """
+    work_dir = tempfile.mkdtemp(prefix=f'blog-bench-{posts}-')
+    stage = None
+    result = None
+    try:
+        with subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--run-size', str(posts), '--seed', str(seed)],
+                cwd=work_dir, stdout=subprocess.PIPE, text=True,
+                env={**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))}) as process:
+            for line in process.stdout:
+                message = json.loads(line)
+                if 'done' in message:
+                    print_stage(message['stage'], message['done'])
+                elif 'stage' in message:
+                    stage = message['stage']
+                else:
+                    result = message
+        if process.returncode or result is None:
+            raise SizeFailed(f'{posts} posts: {describe_exit(process.returncode)} '
+                             f'during {stage or "startup"}')
+    finally:
+        if keep:
+            print(f"  kept {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+def git_commit():
+    """Current commit of the checkout, if there is one"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print per-stage wall time ratios against a baseline; returns the regression count"""
+    previous = {run['posts']: run['stages'] for run in baseline['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created')}):")
+    for run in results['results']:
+        old_stages = previous.get(run['posts'])
+        if old_stages is None:
+            continue
+        for name, stage in run['stages'].items():
+            old = old_stages.get(name)
+            if not old or not old['wall_s']:
+                continue
+            ratio = stage['wall_s'] / old['wall_s']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  <-- slower'
+                regressions += 1
+            print(f"  {run['posts']:>7} {name:<38} {old['wall_s']:>9.3f}s -> {stage['wall_s']:>9.3f}s "
+                  f"({ratio:.2f}x){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the blog pipeline on synthetic exports')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), metavar='N',
+                        help=f'post counts to benchmark (default: {" ".join(map(str, SIZES))})')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic exports')
+    parser.add_argument('--output', '-o', default=RESULTS_PATH,
+                        help=f'where to write the JSON results (default: {RESULTS_PATH})')
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help='earlier results file to compare against; exits 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help=f'slowdown ratio counted as a regression (default: {REGRESSION_THRESHOLD})')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directories')
+    parser.add_argument('--generate', metavar='PATH',
+                        help='only write a synthetic export of --sizes[0] posts to PATH')
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        report(run_size(args.run_size, args.seed))
+        return
+
+    if args.generate:
+        size = generate_export(args.generate, args.sizes[0], args.seed)
+        print(f"✓ Wrote {args.generate} ({args.sizes[0]} entries, {size} bytes)")
+        return
+
+    results = {
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'results': []
+    }
+    failure = None
+    for posts in args.sizes:
+        print(f"Benchmarking {posts} posts...", flush=True)
+        try:
+            run = run_in_subprocess(posts, args.seed, args.keep)
+        except SizeFailed as e:
+            # Larger sizes would only fail the same way
+            failure = str(e)
+            results['failed'] = failure
+            print(f"✗ {failure}", file=sys.stderr)
+            break
+        results['results'].append(run)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f"\n✓ Results written to {args.output}")
+    if failure:
+        sys.exit(1)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
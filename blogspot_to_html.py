@@ -6,16 +6,45 @@ Converts Blogspot export XML to individual HTML blog posts
 
 import xml.etree.ElementTree as ET
 from datetime import datetime
+import argparse
+import base64
+import binascii
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+import hashlib
+import heapq
+import pickle
 import re
 import os
+import sys
+import tempfile
+import time
 from pathlib import Path
 
+from render import add_unsynced, read_state, render_to_string, sync_outputs, write_chunks, write_state
+from templating import get_template, load_templates, templates_fingerprint
+from clean_blog_posts import CLEAN_STAGES
+from generate_blog_index import POST_INDEX_PATH, load_post_index, make_preview, write_post_index
+from minify import write_minified
+import profiling
+
 # Namespace for Atom feeds
 ATOM_NS = {
     'atom': 'http://www.w3.org/2005/Atom',
     'blogger': 'http://schemas.google.com/blogger/2018'
 }
 
+# Incremental build state, keyed by Blogger post id
+MANIFEST_PATH = '.build/manifest.json'
+MANIFEST_VERSION = 1
+
+# Content-addressed home for images that Blogger inlined as data: URIs
+ASSET_DIR = 'images/posts'
+DATA_IMAGE_RE = re.compile(r'(\bsrc\s*=\s*)(["\'])data:image/([\w.+-]+);base64,', re.IGNORECASE)
+IMAGE_EXTENSIONS = {'jpeg': 'jpg', 'svg+xml': 'svg', 'x-icon': 'ico'}
+BASE64_CHUNK = 64 * 1024
+
 def clean_filename(title):
     """Convert title to filename-safe string"""
     # Remove special characters and convert to lowercase
@@ -63,54 +92,161 @@ def extract_category_from_labels(labels):
 
     return 'general'
 
+def _store_data_image(content, start, end, subtype, asset_dir):
+    """Decode content[start:end] chunk by chunk into asset_dir, return its path"""
+    asset_path = Path(asset_dir)
+    asset_path.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+
+    tmp = tempfile.NamedTemporaryFile(dir=asset_path, suffix='.part', delete=False)
+    try:
+        with tmp:
+            leftover = ''
+            for pos in range(start, end, BASE64_CHUNK):
+                # Payloads may be wrapped; drop whitespace and decode whole quanta
+                piece = leftover + ''.join(content[pos:min(pos + BASE64_CHUNK, end)].split())
+                usable = len(piece) - len(piece) % 4
+                data = base64.b64decode(piece[:usable], validate=True)
+                digest.update(data)
+                tmp.write(data)
+                leftover = piece[usable:]
+            if leftover:
+                data = base64.b64decode(leftover + '=' * (-len(leftover) % 4), validate=True)
+                digest.update(data)
+                tmp.write(data)
+    except (binascii.Error, ValueError):
+        os.unlink(tmp.name)
+        return None
+
+    ext = IMAGE_EXTENSIONS.get(subtype.lower(), subtype.lower())
+    target = asset_path / f"{digest.hexdigest()}.{ext}"
+    if target.exists():
+        # Same image already extracted (from this post or another one)
+        os.unlink(tmp.name)
+    else:
+        # NamedTemporaryFile creates owner-only files; assets are served as-is
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, target)
+    return target
+
+def extract_inline_images(content, asset_dir=ASSET_DIR, output_dir='blog', assets=None):
+    """Move base64 data:image payloads into files and point src at them
+
+    Pass a list as assets to receive the paths of the files the content
+    now refers to.
+    """
+    if not content or 'data:image' not in content:
+        return content
+
+    pieces = []
+    last = 0
+    for match in DATA_IMAGE_RE.finditer(content):
+        if match.start() < last:
+            continue
+        payload_start = match.end()
+        payload_end = content.find(match.group(2), payload_start)
+        if payload_end == -1:
+            break
+
+        target = _store_data_image(content, payload_start, payload_end,
+                                   match.group(3), asset_dir)
+        if target is None:
+            continue
+        if assets is not None:
+            assets.append(target.as_posix())
+
+        pieces.append(content[last:match.end(2)])
+        pieces.append(Path(os.path.relpath(target, output_dir)).as_posix())
+        last = payload_end
+
+    if not pieces:
+        return content
+    pieces.append(content[last:])
+    return ''.join(pieces)
+
+def strip_blogger_markup(content):
+    """Remove Blogger-specific elements from post content"""
+    return re.sub(r'<div[^>]*blogger[^>]*>.*?</div>', '', content, flags=re.DOTALL | re.IGNORECASE)
+
+def iter_html_post(title, date, content, labels, original_url):
+    """Yield the HTML for a blog post in chunks"""
+    return get_template('post.html').render({
+        'root': '../',
+        'title': title,
+        'date': date.strftime("%B %d, %Y"),
+        # Clean up content - remove Blogger-specific elements
+        'content': strip_blogger_markup(content),
+        'labels': labels,
+        'url': original_url
+    })
+
 def create_html_post(title, date, content, labels, original_url):
     """Create HTML content for a blog post"""
-    date_str = date.strftime("%B %d, %Y")
-
-    # Clean up content - remove Blogger-specific elements
-    content = re.sub(r'<div[^>]*blogger[^>]*>.*?</div>', '', content, flags=re.DOTALL | re.IGNORECASE)
-
-    html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title} - Cheonkam Jeong</title>
-    <link rel="stylesheet" href="../css/style.css">
-</head>
-<body>
-    <article class="blog-post">
-        <h1>{title}</h1>
-        <p class="post-date">{date_str}</p>
-
-        {content}
-
-        <p class="post-meta">
-            <strong>Categories:</strong> {', '.join(labels)}
-        </p>
-
-        <p class="post-meta">
-            <small>Original post: <a href="{original_url}" target="_blank">{original_url}</a></small>
-        </p>
-    </article>
-
-    <!-- Navigation -->
-    <nav>
-        <ul>
-            <li><a href="../index.html">Home</a></li>
-            <li><a href="../publications.html">Publications</a></li>
-            <li><a href="../blog.html" class="active">Blog</a></li>
-        </ul>
-    </nav>
-
-    <!-- Footer -->
-    <footer>
-        <p>&copy; 2025 Cheonkam Jeong. Last updated: October 2025.</p>
-    </footer>
-</body>
-</html>
-"""
-    return html
+    return render_to_string(iter_html_post(title, date, content, labels, original_url))
+
+def entry_to_post(entry):
+    """Convert an Atom entry element into a post dict (None if skipped)"""
+    # Check if this is a blog post using blogger:type
+    post_type = entry.find('blogger:type', ATOM_NS)
+    if post_type is None or post_type.text != 'POST':
+        return None
+
+    # Check status
+    status = entry.find('blogger:status', ATOM_NS)
+    if status is None or status.text != 'LIVE':
+        return None
+
+    # Get labels from categories
+    labels = []
+    categories = entry.findall('atom:category', ATOM_NS)
+    for category in categories:
+        term = category.get('term', '')
+        if term:
+            labels.append(term)
+
+    # Check if post should be excluded
+    if should_exclude_post(labels):
+        return None
+
+    # Extract post data
+    title_elem = entry.find('atom:title', ATOM_NS)
+    title = title_elem.text if title_elem is not None else 'Untitled'
+
+    published_elem = entry.find('atom:published', ATOM_NS)
+    if published_elem is not None:
+        date = datetime.fromisoformat(published_elem.text.replace('Z', '+00:00'))
+    else:
+        date = datetime.now()
+
+    updated_elem = entry.find('atom:updated', ATOM_NS)
+    if updated_elem is not None and updated_elem.text:
+        updated = datetime.fromisoformat(updated_elem.text.replace('Z', '+00:00'))
+    else:
+        updated = date
+
+    content_elem = entry.find('atom:content', ATOM_NS)
+    content = content_elem.text if content_elem is not None else ''
+
+    # Get original URL from blogger:filename
+    filename_elem = entry.find('blogger:filename', ATOM_NS)
+    if filename_elem is not None and filename_elem.text:
+        original_url = f"https://cheonkamjeong.blogspot.com{filename_elem.text}"
+    else:
+        original_url = ''
+
+    # Blogger post id, stable across edits and title changes
+    id_elem = entry.find('atom:id', ATOM_NS)
+    post_id = id_elem.text if id_elem is not None and id_elem.text else original_url or title
+
+    return {
+        'id': post_id,
+        'title': title,
+        'date': date,
+        'updated': updated,
+        'content': content,
+        'labels': labels,
+        'url': original_url
+    }
 
 def parse_blogspot_xml(xml_file):
     """Parse Blogspot XML and extract blog posts"""
@@ -120,135 +256,465 @@ def parse_blogspot_xml(xml_file):
     posts = []
 
     for entry in root.findall('atom:entry', ATOM_NS):
-        # Check if this is a blog post using blogger:type
-        post_type = entry.find('blogger:type', ATOM_NS)
-        if post_type is None or post_type.text != 'POST':
-            continue
-
-        # Check status
-        status = entry.find('blogger:status', ATOM_NS)
-        if status is None or status.text != 'LIVE':
-            continue
+        post = entry_to_post(entry)
+        if post is not None:
+            posts.append(post)
 
-        # Get labels from categories
-        labels = []
-        categories = entry.findall('atom:category', ATOM_NS)
-        for category in categories:
-            term = category.get('term', '')
-            if term:
-                labels.append(term)
+    # Sort by date (newest first)
+    posts.sort(key=lambda x: x['date'], reverse=True)
 
-        # Check if post should be excluded
-        if should_exclude_post(labels):
-            continue
+    return posts
 
-        # Extract post data
-        title_elem = entry.find('atom:title', ATOM_NS)
-        title = title_elem.text if title_elem is not None else 'Untitled'
+def iter_blogspot_posts(xml_file):
+    """Yield posts one at a time in document order without building the tree"""
+    entry_tag = f"{{{ATOM_NS['atom']}}}entry"
+    context = ET.iterparse(xml_file, events=('start', 'end'))
+    root = None
 
-        published_elem = entry.find('atom:published', ATOM_NS)
-        if published_elem is not None:
-            date = datetime.fromisoformat(published_elem.text.replace('Z', '+00:00'))
-        else:
-            date = datetime.now()
+    for event, elem in context:
+        if root is None:
+            root = elem
+        if event != 'end' or elem.tag != entry_tag:
+            continue
 
-        content_elem = entry.find('atom:content', ATOM_NS)
-        content = content_elem.text if content_elem is not None else ''
+        post = entry_to_post(elem)
+        # Drop the finished entry (and anything before it) from the tree
+        root.clear()
+        if post is not None:
+            yield post
+
+def _write_run(posts, tmp_dir):
+    """Spill a sorted run of posts to a temporary file"""
+    run_file = tempfile.NamedTemporaryFile(dir=tmp_dir, suffix='.run', delete=False)
+    with run_file:
+        for post in posts:
+            pickle.dump(post, run_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return run_file.name
+
+def _read_run(run_path):
+    """Read back a run written by _write_run"""
+    with open(run_path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+def iter_sorted_posts(xml_file, run_size=500):
+    """Stream posts newest first using a bounded external merge sort
+
+    At most ``run_size`` posts are held in memory while reading; sorted runs
+    are spilled to temporary files and merged lazily.
+    """
+    with tempfile.TemporaryDirectory(prefix='blogspot-runs-') as tmp_dir:
+        runs = []
+        buffer = []
+        for post in iter_blogspot_posts(xml_file):
+            buffer.append(post)
+            if len(buffer) >= run_size:
+                buffer.sort(key=lambda x: x['date'], reverse=True)
+                runs.append(_write_run(buffer, tmp_dir))
+                buffer = []
+
+        buffer.sort(key=lambda x: x['date'], reverse=True)
+        if not runs:
+            # Everything fit in a single run, no need to touch the disk
+            yield from buffer
+            return
+        if buffer:
+            runs.append(_write_run(buffer, tmp_dir))
+            buffer = []
+
+        # heapq.merge is stable across runs, so ties keep document order
+        yield from heapq.merge(*(_read_run(run) for run in runs),
+                               key=lambda x: x['date'], reverse=True)
+
+def post_fingerprint(post, stages=()):
+    """Hash every input that ends up in a post's rendered HTML
+
+    Takes the post as parsed (before the stages run) plus the stage names.
+    Each field goes into the hash with its length in front, which is much
+    cheaper than serializing the post first.
+    """
+    digest = hashlib.sha256()
+    for value in (str(len(stages)), *(stage.__name__ for stage in stages),
+                  post['title'], post['content'] or '',
+                  str(len(post['labels'])), *post['labels'],
+                  post['date'].isoformat(), post['updated'].isoformat(), post['url']):
+        data = value.encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    """Load the build manifest, or an empty one if there is none yet"""
+    manifest = read_state(manifest_path, {})
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'posts': {}}
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """Write the build manifest atomically"""
+    write_state(manifest_path, manifest, ensure_ascii=False, indent=1, sort_keys=True)
+
+def build_settings(output_path, minify, asset_dir):
+    """Settings that every post in the manifest was built with"""
+    return {
+        'output_dir': str(output_path),
+        'templates': templates_fingerprint(),
+        'minify': minify,
+        'asset_dir': str(asset_dir) if asset_dir else None
+    }
 
-        # Get original URL from blogger:filename
-        filename_elem = entry.find('blogger:filename', ATOM_NS)
-        if filename_elem is not None and filename_elem.text:
-            original_url = f"https://cheonkamjeong.blogspot.com{filename_elem.text}"
+def build_settings_match(manifest, output_path, minify, asset_dir):
+    """True if the manifest was saved with these settings"""
+    return all(manifest.get(key) == value
+               for key, value in build_settings(output_path, minify, asset_dir).items())
+
+def save_build_manifest(manifest, output_path, minify, asset_dir, manifest_path):
+    """Record the settings the posts in manifest were built with, then save it"""
+    manifest.update(build_settings(output_path, minify, asset_dir))
+    save_manifest(manifest, manifest_path)
+
+def render_post_file(post, filepath, asset_dir=ASSET_DIR, minify=False):
+    """Render a single post and write it to filepath
+
+    Returns the path, the number of bytes minification saved, whether the
+    file was written (it is left alone if it already has these bytes) and
+    the extracted images the page refers to.
+    """
+    start = time.perf_counter()
+    content = post['content']
+    assets = []
+    if asset_dir:
+        with profiling.stage('extract images'):
+            content = extract_inline_images(content, asset_dir, Path(filepath).parent, assets)
+
+    chunks = profiling.materialize('render', iter_html_post(
+        post['title'],
+        post['date'],
+        content,
+        post['labels'],
+        post['url']
+    ))
+    saved = 0
+    with profiling.stage('write'):
+        if minify:
+            before, after, written = write_minified(filepath, chunks)
+            saved = before - after
         else:
-            original_url = ''
-
-        posts.append({
-            'title': title,
-            'date': date,
-            'content': content,
-            'labels': labels,
-            'url': original_url
-        })
-
-    # Sort by date (newest first)
-    posts.sort(key=lambda x: x['date'], reverse=True)
-
-    return posts
+            written = write_chunks(filepath, chunks)
+
+    profiling.record_item(str(filepath), time.perf_counter() - start, start)
+    return str(filepath), saved, written, sorted(set(assets))
+
+def _render_chunk(chunk, asset_dir, minify, profile=False):
+    """Worker entry point: render and write a chunk of (post, filepath) pairs
+
+    Returns the results and, when profiling, what the worker measured.
+    """
+    if profile:
+        profiling.enable()
+        # Forked workers start with a copy of the parent's measurements
+        profiling.take()
+    results = [render_post_file(post, filepath, asset_dir, minify) for post, filepath in chunk]
+    return results, profiling.take() if profile else None
+
+def post_index_record(post, filename, fingerprint):
+    """Metadata index entry for a post, as read by generate_blog_index"""
+    return {
+        'filename': filename,
+        'slug': filename[:-len('.html')],
+        'title': post['title'],
+        'date': post['date'].isoformat(),
+        'updated': post['updated'].isoformat(),
+        'labels': post['labels'],
+        'preview': make_preview(strip_blogger_markup(post['content'] or '')),
+        'hash': fingerprint
+    }
 
-def generate_blog_files(posts, output_dir='blog'):
-    """Generate HTML files for all posts"""
+def apply_stages(post, stages):
+    """Run pipeline stages over a copy of the post dict"""
+    post = dict(post)
+    for stage in stages:
+        post = stage(post)
+    return post
+
+def generate_blog_files(posts, output_dir='blog', manifest_path=None, force=False,
+                        jobs=1, chunk_size=16, asset_dir=ASSET_DIR, index_path=None,
+                        stages=(), minify=False, records=None):
+    """Generate HTML files for all posts
+
+    With a manifest, posts whose inputs hash the same as last time are not
+    re-rendered, and outputs of posts that disappeared from the export are
+    deleted. With jobs > 1, rendering and writing is spread over a process
+    pool in chunks; results are collected in submission order so the output
+    matches the serial path. Inline data:image payloads are extracted into
+    asset_dir (pass None to leave them inline). With index_path, a sidecar
+    metadata index is written for generate_blog_index. Each post goes
+    through stages (e.g. clean_blog_posts.CLEAN_STAGES) before rendering;
+    the filename is still derived from the original title. With minify,
+    pages are passed through minify.minify_html before they are written.
+    Pass a dict as records to receive the sidecar index records by filename.
+    Pages that come out byte-identical are not rewritten and not listed in
+    the returned files.
+    """
     output_path = Path(output_dir)
     output_path.mkdir(exist_ok=True)
 
     category_posts = {}
     generated_files = []
-
-    for post in posts:
-        # Create filename
-        filename = clean_filename(post['title']) + '.html'
-        filepath = output_path / filename
-
-        # Determine category
-        category = extract_category_from_labels(post['labels'])
-        if category not in category_posts:
-            category_posts[category] = []
-
-        category_posts[category].append({
-            'title': post['title'],
-            'date': post['date'],
-            'filename': filename,
-            'preview': post['content'][:200] if post['content'] else ''
-        })
-
-        # Generate HTML
-        html_content = create_html_post(
-            post['title'],
-            post['date'],
-            post['content'],
-            post['labels'],
-            post['url']
-        )
-
-        # Write file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-
-        generated_files.append(str(filepath))
-        print(f"Generated: {filepath}")
+    saved_bytes = 0
+
+    manifest = load_manifest(manifest_path) if manifest_path else None
+    previous = {}
+    if manifest is not None and manifest.get('output_dir') == str(output_path):
+        previous = manifest['posts']
+        # A template edit changes every page even if no post did
+        if manifest.get('templates') != templates_fingerprint():
+            force = True
+        if manifest.get('minify', False) != minify:
+            force = True
+        # Switching between inline and extracted images changes every page
+        # that has one (manifests from before extraction were inline)
+        if manifest.get('asset_dir') != (str(asset_dir) if asset_dir else None):
+            force = True
+    current = {}
+    live_files = set()
+
+    previous_index = load_post_index(index_path) if index_path else {}
+    index_records = {}
+
+    # Compile templates once; forked workers inherit the cache and spawned
+    # ones build their own in the initializer
+    load_templates()
+    executor = None
+    if jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=load_templates)
+    pending = deque()  # (future, filenames, manifest entries) in submission order
+    chunk = []
+    chunk_entries = {}
+
+    def manifest_entry(entry, assets):
+        # Extracted images are recorded so a deleted one brings its post back
+        return {**entry, 'assets': assets} if assets else entry
+
+    def report(path, saved, written):
+        nonlocal saved_bytes
+        if not written:
+            return
+        generated_files.append(path)
+        saved_bytes += saved
+        print(f"Generated: {path}" + (f" (minified, saved {saved} bytes)" if minify else ""))
+
+    def collect(keep):
+        while len(pending) > keep:
+            future, _, entries = pending.popleft()
+            results, collected = future.result()
+            profiling.merge(collected)
+            # Workers leave fsync to this process
+            add_unsynced(path for path, _, written, _ in results if written)
+            for (path, saved, written, assets), (post_id, entry) in zip(results, entries.items()):
+                report(path, saved, written)
+                current[post_id] = manifest_entry(entry, assets)
+
+    @contextmanager
+    def saved_on_failure():
+        # Keep the posts that did get built, so a failed run is not repeated in full
+        try:
+            yield
+        except BaseException:
+            if manifest is not None:
+                sync_outputs()
+                manifest['posts'] = current if force else {**previous, **current}
+                save_build_manifest(manifest, output_path, minify, asset_dir, manifest_path)
+            raise
+
+    def submit_chunk():
+        pending.append((executor.submit(_render_chunk, chunk[:], asset_dir, minify,
+                                        profiling.enabled()),
+                        {Path(path).name for _, path in chunk}, dict(chunk_entries)))
+        chunk.clear()
+        chunk_entries.clear()
+        # Bound the number of rendered-but-uncollected chunks
+        collect(jobs * 2)
+
+    with saved_on_failure(), executor or nullcontext():
+        for source_post in posts:
+            # Create filename
+            filename = clean_filename(source_post['title']) + '.html'
+            filepath = output_path / filename
+            # Stages only run for posts that are rendered or re-indexed
+            post = None
+
+            # Determine category
+            category = extract_category_from_labels(source_post['labels'])
+            if category not in category_posts:
+                category_posts[category] = []
+
+            category_posts[category].append({
+                'title': source_post['title'],
+                'date': source_post['date'],
+                'filename': filename,
+                'preview': source_post['content'][:200] if source_post['content'] else ''
+            })
+
+            live_files.add(filename)
+            fingerprint = None
+            if manifest is not None or index_path:
+                with profiling.stage('fingerprint'):
+                    fingerprint = post_fingerprint(source_post, stages)
+
+            if index_path:
+                old_record = previous_index.get(filename)
+                if old_record is not None and old_record.get('hash') == fingerprint:
+                    record = old_record
+                else:
+                    with profiling.stage('clean'):
+                        post = apply_stages(source_post, stages)
+                    record = post_index_record(post, filename, fingerprint)
+                # Later posts with the same filename overwrite the file, so they win here too
+                index_records.pop(filename, None)
+                index_records[filename] = record
+
+            entry = {'hash': fingerprint, 'filename': filename}
+            if manifest is not None:
+                old = previous.get(source_post['id'])
+                if (not force and old is not None and old['hash'] == fingerprint
+                        and old['filename'] == filename and filepath.exists()
+                        and all(os.path.exists(asset) for asset in old.get('assets', ()))):
+                    current[source_post['id']] = old
+                    continue
+
+            if post is None:
+                with profiling.stage('clean'):
+                    post = apply_stages(source_post, stages)
+
+            if executor is None:
+                path, saved, written, assets = render_post_file(post, filepath, asset_dir, minify)
+                report(path, saved, written)
+                current[post['id']] = manifest_entry(entry, assets)
+                continue
+
+            # Two posts with the same title write the same file; let earlier
+            # chunks finish so the later post still wins, as in the serial path
+            if any(filename in names for _, names, _ in pending):
+                if chunk:
+                    submit_chunk()
+                collect(0)
+
+            chunk.append((post, str(filepath)))
+            chunk_entries[post['id']] = entry
+            if len(chunk) >= chunk_size:
+                submit_chunk()
+
+        if executor is not None:
+            if chunk:
+                submit_chunk()
+            collect(0)
+
+    with profiling.stage('build state'):
+        # Posts must be on disk before the manifest says they were built
+        sync_outputs()
+        if manifest is not None:
+            # Remove outputs of posts that were deleted, drafted or renamed
+            for post_id, old in previous.items():
+                if old['filename'] in live_files:
+                    continue
+                stale = output_path / old['filename']
+                if stale.exists():
+                    stale.unlink()
+                    print(f"Removed: {stale}")
+
+            # A run that built nothing leaves the manifest as it was
+            if not build_settings_match(manifest, output_path, minify, asset_dir) or current != previous:
+                manifest['posts'] = current
+                save_build_manifest(manifest, output_path, minify, asset_dir, manifest_path)
+
+        if index_path:
+            # Record what was written so hand edits fall back to HTML parsing
+            index_changed = list(index_records) != list(previous_index)
+            for filename, record in index_records.items():
+                stat = (output_path / filename).stat()
+                if (record is not previous_index.get(filename) or record.get('mtime_ns') != stat.st_mtime_ns
+                        or record.get('size') != stat.st_size):
+                    index_changed = True
+                record['mtime_ns'] = stat.st_mtime_ns
+                record['size'] = stat.st_size
+            if index_changed:
+                write_post_index(index_records.values(), index_path)
+            if records is not None:
+                records.update(index_records)
+
+    if minify and generated_files:
+        print(f"Minification saved {saved_bytes} bytes over {len(generated_files)} pages")
 
     return generated_files, category_posts
 
 def main():
-    import sys
-
-    if len(sys.argv) < 2:
-        print("Usage: python blogspot_to_html.py <blogspot_xml_file>")
-        print("\nExample:")
-        print("  python blogspot_to_html.py blog-10-22-2025.xml")
-        sys.exit(1)
-
-    xml_file = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description='Convert a Blogspot export XML to HTML blog posts',
+        epilog='Example: python blogspot_to_html.py blog-10-22-2025.xml')
+    parser.add_argument('xml_file', help='Blogspot export XML file')
+    parser.add_argument('--stream', action='store_true',
+                        help='parse with iterparse and an external sort to keep memory flat')
+    parser.add_argument('--force', action='store_true',
+                        help='re-render every post even if the build manifest says it is unchanged')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='render posts in N worker processes (0 = one per CPU)')
+    parser.add_argument('--asset-dir', default=ASSET_DIR,
+                        help=f'directory for extracted data:image payloads (default: {ASSET_DIR})')
+    parser.add_argument('--inline-images', action='store_true',
+                        help='keep data:image payloads inline instead of extracting them')
+    parser.add_argument('--no-clean', action='store_true',
+                        help='skip the title and formatting cleanup stages')
+    parser.add_argument('--minify', action='store_true',
+                        help='minify the generated pages (see minify.py)')
+    parser.add_argument('--index', default=POST_INDEX_PATH,
+                        help=f'sidecar metadata index for generate_blog_index (default: {POST_INDEX_PATH})')
+    parser.add_argument('--manifest', default=MANIFEST_PATH,
+                        help=f'build manifest path (default: {MANIFEST_PATH})')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
+    xml_file = args.xml_file
 
     if not os.path.exists(xml_file):
         print(f"Error: File '{xml_file}' not found")
         sys.exit(1)
 
     print(f"Parsing {xml_file}...")
-    posts = parse_blogspot_xml(xml_file)
-    print(f"Found {len(posts)} blog posts")
+    if args.stream:
+        # Parsing happens lazily while posts are rendered
+        posts = profiling.timed_iter('parse', iter_sorted_posts(xml_file))
+    else:
+        with profiling.stage('parse'):
+            posts = parse_blogspot_xml(xml_file)
+        print(f"Found {len(posts)} blog posts")
 
     print("\nGenerating HTML files...")
-    generated_files, category_posts = generate_blog_files(posts)
-
-    print(f"\n✓ Successfully generated {len(generated_files)} blog posts")
+    generated_files, category_posts = generate_blog_files(
+        posts, manifest_path=args.manifest, force=args.force,
+        jobs=args.jobs or os.cpu_count() or 1,
+        asset_dir=None if args.inline_images else args.asset_dir,
+        index_path=args.index,
+        stages=() if args.no_clean else CLEAN_STAGES,
+        minify=args.minify)
+
+    total = sum(len(posts_list) for posts_list in category_posts.values())
+    print(f"\n✓ Successfully generated {len(generated_files)} blog posts "
+          f"({total - len(generated_files)} unchanged)")
     print(f"\nCategories found:")
     for category, posts_list in category_posts.items():
         print(f"  - {category}: {len(posts_list)} posts")
 
-    print("\nNext steps:")
+    print("\nNext steps (or run build.py build to do all of this in one go):")
     print("1. Review the generated files in the blog/ directory")
-    print("2. Update blog.html to include all posts")
-    print("3. Create/update category pages (book-summaries.html, paper-reviews.html, etc.)")
+    print("2. Run generate_blog_index.py to update blog.html and the category pages")
+    print("3. Run precompress.py to write .gz/.br copies for static hosting")
+
+    profiling.finish(args)
 
 if __name__ == '__main__':
     main()
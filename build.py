@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Build the blog in one process
+Runs the whole pipeline that blogspot_to_html.py, clean_blog_posts.py and
+generate_blog_index.py run separately: parse the export, clean and render
+the posts, then write the listing pages, feeds, sitemap and search index.
+Post metadata is handed from stage to stage in memory instead of being
+re-read from disk by the next script.
+
+    python build.py build                      # default stages
+    python build.py build --only pages feeds   # just those stages
+    python build.py build --with precompress   # defaults plus precompression
+    python build.py watch                      # rebuild what an edit affects
+    python build.py serve                      # preview from memory, with live reload
+    python build.py deploy-plan                # what changed since the last deploy
+
+watch polls the export, the posts in blog/, the templates and
+css/style.css. A hand-edited post only refreshes the index and category
+pages it is listed on and the feeds it appears in; an edited listing
+template only rewrites the listing pages. The export and post.html (or
+the layouts it extends) still need the incremental full build.
+"""
+
+import argparse
+import bisect
+import os
+import sys
+import time
+from pathlib import Path
+
+from blogspot_to_html import (ASSET_DIR, MANIFEST_PATH, generate_blog_files, iter_sorted_posts,
+                              parse_blogspot_xml)
+from clean_blog_posts import CLEAN_STAGES
+from feeds import FEED_SIZE, write_feeds
+from generate_blog_index import (POST_INDEX_PATH, categorize_posts, category_keys, category_page_path,
+                                 extract_metadata_from_html, index_page_path, invalidate_graph,
+                                 is_listing_page, iter_sitemap_entries, load_post_index, paginate, post_info_from_metadata,
+                                 post_sort_key, write_listing_pages, write_post_index, write_search_page,
+                                 write_site_pages)
+from image_pipeline import process_site as process_images
+from localize_assets import localize_site
+from precompress import compress_file, precompress_site
+from search_index import build_search_index
+from sitemap import write_sitemap
+from dev_server import serve
+import deploy_plan
+import profiling
+import templating
+
+XML_FILE = 'blog-export.xml'
+# In pipeline order
+STAGES = ('convert', 'localize', 'images', 'pages', 'feeds', 'sitemap', 'search', 'precompress')
+# localize fetches from the network, images needs Pillow and precompress
+# doubles the files on disk, so those run only when asked for
+DEFAULT_STAGES = ('convert', 'pages', 'feeds', 'sitemap', 'search')
+STYLESHEET = 'css/style.css'
+# Templates that pages are rendered from (the rest are layouts and partials)
+PAGE_TEMPLATES = ('post.html', 'index.html', 'category.html', 'search.html')
+WATCH_INTERVAL = 0.1
+
+def select_stages(only=None, skip=(), extra=()):
+    """Resolve --only/--skip/--with into the stages to run, in pipeline order"""
+    wanted = set(only) if only else set(DEFAULT_STAGES) | set(extra)
+    wanted -= set(skip)
+    return tuple(stage for stage in STAGES if stage in wanted)
+
+def parse_export(xml_file, stream=False):
+    """Parse the export (lazily, in date order, with stream)"""
+    print(f"Parsing {xml_file}...")
+    if stream:
+        return profiling.timed_iter('parse', iter_sorted_posts(xml_file))
+    with profiling.stage('parse'):
+        posts = parse_blogspot_xml(xml_file)
+    print(f"Found {len(posts)} blog posts")
+    return posts
+
+def build(xml_file=XML_FILE, stages=DEFAULT_STAGES, force=False, jobs=1, stream=False,
+          clean=True, minify=False, asset_dir=ASSET_DIR, per_page=0, feed_size=FEED_SIZE,
+          asset_source=None, explain=False, posts=None):
+    """Run the selected stages; returns the post records, by filename
+
+    posts, if given, are the already parsed export (the watch loop keeps
+    them in memory between rebuilds).
+    """
+    records = {}
+    if 'convert' in stages:
+        if posts is None:
+            posts = parse_export(xml_file, stream)
+
+        print("\nGenerating HTML files...")
+        generated_files, _ = generate_blog_files(
+            posts, manifest_path=MANIFEST_PATH, force=force, jobs=jobs,
+            asset_dir=asset_dir, index_path=POST_INDEX_PATH,
+            stages=CLEAN_STAGES if clean else (), minify=minify, records=records)
+        print(f"✓ {len(generated_files)} post(s) written, {len(records) - len(generated_files)} unchanged")
+    else:
+        records = load_post_index(POST_INDEX_PATH)
+
+    if 'localize' in stages:
+        print("\nLocalizing remote images...")
+        with profiling.stage('localize'):
+            localize_site(index=records, source=asset_source)
+    if 'images' in stages:
+        print("\nGenerating responsive images...")
+        with profiling.stage('images'):
+            process_images(index=records)
+    if records and ('localize' in stages or 'images' in stages):
+        # Those stages rewrote posts in place and updated their records
+        write_post_index(records.values(), POST_INDEX_PATH)
+
+    site_stages = {stage: stage in stages for stage in ('pages', 'feeds', 'sitemap', 'search')}
+    if any(site_stages.values()):
+        with profiling.stage('scan'):
+            all_posts, posts_by_category = categorize_posts(index=records)
+        print(f"\nFound {len(all_posts)} posts in {len(posts_by_category)} categories")
+        write_site_pages(all_posts, posts_by_category, per_page=per_page, force=force,
+                         minify_pages=minify, feed_size=feed_size, explain=explain, **site_stages)
+
+    if 'precompress' in stages:
+        print("\nPrecompressing...")
+        with profiling.stage('precompress'):
+            compressed, skipped = precompress_site()
+        print(f"✓ Compressed {len(compressed)} file(s), {skipped} unchanged")
+
+    return records
+
+def add_build_arguments(parser):
+    """Options shared by every command that builds the site"""
+    parser.add_argument('xml_file', nargs='?', default=XML_FILE,
+                        help=f'Blogspot export XML file (default: {XML_FILE})')
+    parser.add_argument('--only', nargs='+', choices=STAGES, metavar='STAGE',
+                        help=f'run only these stages ({", ".join(STAGES)})')
+    parser.add_argument('--skip', nargs='+', choices=STAGES, default=(), metavar='STAGE',
+                        help='leave these stages out')
+    parser.add_argument('--with', dest='extra', nargs='+', choices=STAGES, default=(), metavar='STAGE',
+                        help='add optional stages (localize, images, precompress) to the defaults')
+    parser.add_argument('--force', action='store_true',
+                        help='rewrite every output even if its inputs are unchanged')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='render posts in N worker processes (0 = one per CPU)')
+    parser.add_argument('--stream', action='store_true',
+                        help='parse with iterparse and an external sort to keep memory flat')
+    parser.add_argument('--no-clean', action='store_true',
+                        help='skip the title and formatting cleanup stages')
+    parser.add_argument('--minify', action='store_true', help='minify the generated pages')
+    parser.add_argument('--inline-images', action='store_true',
+                        help='keep data:image payloads inline instead of extracting them')
+    parser.add_argument('--per-page', type=int, default=0, metavar='N',
+                        help='posts per index/category page (default: 0, all on one page)')
+    parser.add_argument('--feed-size', type=int, default=FEED_SIZE, metavar='N',
+                        help=f'posts in feed.xml, rss.xml and feed.json (default: {FEED_SIZE})')
+    parser.add_argument('--asset-source', metavar='DIR_OR_URL',
+                        help='local mirror for the localize stage (see localize_assets.py)')
+    parser.add_argument('--explain', action='store_true',
+                        help='print why each listing page, feed and sitemap is rebuilt')
+
+def build_options(args):
+    """Keyword arguments for build() from parsed command-line options"""
+    return {
+        'xml_file': args.xml_file,
+        'stages': select_stages(args.only, args.skip, args.extra),
+        'force': args.force,
+        'jobs': args.jobs or os.cpu_count() or 1,
+        'stream': args.stream,
+        'clean': not args.no_clean,
+        'minify': args.minify,
+        'asset_dir': None if args.inline_images else ASSET_DIR,
+        'per_page': args.per_page,
+        'feed_size': args.feed_size,
+        'asset_source': args.asset_source,
+        'explain': args.explain,
+    }
+
+def cmd_build(args):
+    options = build_options(args)
+    if 'convert' in options['stages'] and not os.path.exists(args.xml_file):
+        print(f"Error: File '{args.xml_file}' not found")
+        sys.exit(1)
+    print(f"Stages: {', '.join(options['stages'])}\n")
+    build(**options)
+    print("\n✓ All done!")
+
+def snapshot(xml_file, blog_dir='blog'):
+    """(mtime, size) of every file the watch loop reacts to, by path"""
+    stats = {}
+    for path in (xml_file, STYLESHEET):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stats[path] = (stat.st_mtime_ns, stat.st_size)
+    _scan(blog_dir, stats)
+    _scan(templating.TEMPLATE_DIR, stats, recursive=True)
+    return stats
+
+def _scan(directory, stats, recursive=False):
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.is_dir():
+            if recursive:
+                _scan(entry.path, stats, recursive)
+        elif entry.name.endswith('.html'):
+            stat = entry.stat()
+            stats[Path(entry.path).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+
+def _listing_key(post):
+    # all_posts is newest first, ties in filename order (see categorize_posts)
+    return -post_sort_key(post).toordinal(), post['filename']
+
+def move_post(all_posts, posts_by_category, filename, metadata):
+    """Move one post to its place in the in-memory listings
+
+    metadata is None for a deleted post. Returns the positions the post
+    left and took in all_posts and the categories it was or is listed in.
+    """
+    positions = []
+    categories = set()
+    for position, post in enumerate(all_posts):
+        if post['filename'] == filename:
+            del all_posts[position]
+            positions.append(position)
+            break
+    for category, posts in list(posts_by_category.items()):
+        kept = [post for post in posts if post['filename'] != filename]
+        if len(kept) != len(posts):
+            categories.add(category)
+            if kept:
+                posts_by_category[category] = kept
+            else:
+                del posts_by_category[category]
+
+    if metadata is not None:
+        post_info = post_info_from_metadata(filename, metadata)
+        key = _listing_key(post_info)
+        position = bisect.bisect_left(all_posts, key, key=_listing_key)
+        all_posts.insert(position, post_info)
+        positions.append(position)
+        for category in category_keys(metadata):
+            posts = posts_by_category.setdefault(category, [])
+            posts.insert(bisect.bisect_left(posts, key, key=_listing_key), post_info)
+            categories.add(category)
+    return positions, categories
+
+def affected_outputs(positions, categories, total_before, all_posts, posts_by_category,
+                     per_page=0, feed_size=FEED_SIZE):
+    """Listing pages and feeds that show a post at the given positions"""
+    pages = set()
+    feeds = {f'feeds/{category}.xml' for category in categories}
+    if not positions:
+        return pages, feeds
+
+    total_pages = len(paginate(all_posts, per_page))
+    if per_page <= 0:
+        pages.add(index_page_path(1))
+    else:
+        first, last = min(positions) // per_page, max(positions) // per_page
+        if len(all_posts) != total_before:
+            # Every later post moved up or down a slot
+            last = total_pages - 1
+        if total_pages != len(paginate([None] * total_before, per_page)):
+            # Every page shows the page count
+            first = 0
+        pages.update(index_page_path(page + 1) for page in range(first, min(last, total_pages - 1) + 1))
+    for category in categories:
+        for page in range(len(paginate(posts_by_category.get(category, []), per_page))):
+            pages.add(category_page_path(category, page + 1))
+
+    if min(positions) < feed_size:
+        feeds.update(('feed.xml', 'rss.xml', 'feed.json'))
+    return pages, feeds
+
+def refresh_posts(filenames, all_posts, posts_by_category, options, blog_dir='blog'):
+    """Re-read edited posts and rewrite only the listings that show them
+
+    Returns the paths written.
+    """
+    total_before = len(all_posts)
+    positions = []
+    categories = set()
+    for filename in filenames:
+        path = Path(blog_dir) / filename
+        metadata = extract_metadata_from_html(path) if path.exists() else None
+        moved, listed = move_post(all_posts, posts_by_category, filename, metadata)
+        positions.extend(moved)
+        categories |= listed
+
+    pages, feeds = affected_outputs(positions, categories, total_before, all_posts, posts_by_category,
+                                    options['per_page'], options['feed_size'])
+    # These writes bypass the dependency graph, so the next build compares every output
+    invalidate_graph()
+    written = []
+    if 'pages' in options['stages']:
+        pages_written, _ = write_listing_pages(all_posts, posts_by_category, per_page=options['per_page'],
+                                               minify_pages=options['minify'], only=pages)
+        written.extend(path for path, _, _ in pages_written)
+    if 'feeds' in options['stages']:
+        written.extend(write_feeds(all_posts, posts_by_category, feed_size=options['feed_size'], only=feeds))
+    return written
+
+def refresh_indexes(all_posts, posts_by_category, options):
+    """Bring the sitemap and search index up to date (slower, whole-site outputs)"""
+    if 'sitemap' in options['stages']:
+        write_sitemap(iter_sitemap_entries(all_posts, posts_by_category, options['per_page']))
+    if 'search' in options['stages']:
+        build_search_index(all_posts)
+
+def rebuild(changed, options, state):
+    """Handle one batch of changed files, updating the in-memory state"""
+    started = time.perf_counter()
+    stages = options['stages']
+    templates = {Path(path).relative_to(templating.TEMPLATE_DIR).as_posix() for path in changed
+                 if Path(path).is_relative_to(templating.TEMPLATE_DIR)}
+    if templates:
+        templating.clear_templates()
+    affected = {name for name in PAGE_TEMPLATES
+                if (templating.TEMPLATE_DIR / name).exists()
+                and templating.template_dependencies(name) & templates}
+
+    if options['xml_file'] in changed or 'post.html' in affected:
+        reason = options['xml_file'] if options['xml_file'] in changed else 'post template'
+        print(f"\n{reason} changed: rebuilding")
+        if options['xml_file'] in changed and 'convert' in stages:
+            state['posts'] = parse_export(options['xml_file'])
+        state['records'] = build(**options, posts=state['posts'])
+        state['all_posts'], state['posts_by_category'] = categorize_posts(index=state['records'])
+        print(f"✓ Rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return
+
+    all_posts, posts_by_category = state['all_posts'], state['posts_by_category']
+    written = []
+    if 'pages' in stages and affected & {'index.html', 'category.html'}:
+        print("\nListing templates changed")
+        invalidate_graph()
+        pages_written, _ = write_listing_pages(all_posts, posts_by_category, per_page=options['per_page'],
+                                               minify_pages=options['minify'])
+        written.extend(path for path, _, _ in pages_written)
+    if 'search' in stages and 'search.html' in affected and write_search_page():
+        written.append('search.html')
+
+    blog_dir = Path('blog')
+    edited = sorted(Path(path).name for path in changed
+                    if Path(path).parent == blog_dir and not is_listing_page(path))
+    if edited:
+        print(f"\n{', '.join(edited)} changed")
+        written.extend(refresh_posts(edited, all_posts, posts_by_category, options))
+
+    for path in written:
+        print(f"✓ Updated {path}")
+    if STYLESHEET in changed:
+        # Pages only link to it
+        print(f"\n{STYLESHEET} changed, no pages to rebuild")
+        written.append(STYLESHEET)
+
+    if 'precompress' in stages:
+        for path in written:
+            if Path(path).exists():
+                compress_file(Path(path))
+    print(f"✓ Refreshed in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    if edited:
+        refresh_indexes(all_posts, posts_by_category, options)
+        print(f"✓ Sitemap and search index updated ({(time.perf_counter() - started) * 1000:.0f} ms total)")
+
+def cmd_watch(args):
+    options = build_options(args)
+    # The parsed export is kept for rebuilds after a template change
+    options['stream'] = False
+    stages = options['stages']
+    if 'convert' in stages and not os.path.exists(args.xml_file):
+        print(f"Error: File '{args.xml_file}' not found")
+        sys.exit(1)
+
+    print(f"Stages: {', '.join(stages)}\n")
+    state = {'posts': parse_export(args.xml_file) if 'convert' in stages else None}
+    state['records'] = build(**options, posts=state['posts'])
+    state['all_posts'], state['posts_by_category'] = categorize_posts(index=state['records'])
+    seen = snapshot(args.xml_file)
+    print(f"\nWatching {args.xml_file}, blog/, templates/ and {STYLESHEET} (Ctrl+C to stop)")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = snapshot(args.xml_file)
+            changed = {path for path in seen.keys() | current.keys() if seen.get(path) != current.get(path)}
+            if not changed:
+                continue
+            try:
+                rebuild(changed, options, state)
+            except (OSError, templating.TemplateError) as e:
+                print(f"✗ Rebuild failed: {e}")
+            seen = snapshot(args.xml_file)
+    except KeyboardInterrupt:
+        print("\n✓ Stopped watching")
+
+def cmd_serve(args):
+    if not os.path.exists(args.xml_file):
+        print(f"Error: File '{args.xml_file}' not found")
+        sys.exit(1)
+    serve(args.xml_file, stages=() if args.no_clean else CLEAN_STAGES, per_page=args.per_page,
+          minify=args.minify, host=args.host, port=args.port, interval=args.interval)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the blog from a Blogspot export')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='run the build pipeline once')
+    add_build_arguments(build_parser)
+    profiling.add_arguments(build_parser)
+    build_parser.set_defaults(func=cmd_build)
+
+    watch_parser = commands.add_parser('watch', help='build, then rebuild what each edit affects')
+    add_build_arguments(watch_parser)
+    watch_parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+                              help=f'how often to check for changes (default: {WATCH_INTERVAL})')
+    profiling.add_arguments(watch_parser)
+    watch_parser.set_defaults(func=cmd_watch)
+
+    serve_parser = commands.add_parser('serve', help='preview the site from memory with live reload')
+    serve_parser.add_argument('xml_file', nargs='?', default=XML_FILE,
+                              help=f'Blogspot export XML file (default: {XML_FILE})')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='address to bind (default: 127.0.0.1)')
+    serve_parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    serve_parser.add_argument('--no-clean', action='store_true',
+                              help='skip the title and formatting cleanup stages')
+    serve_parser.add_argument('--minify', action='store_true', help='minify the rendered pages')
+    serve_parser.add_argument('--per-page', type=int, default=0, metavar='N',
+                              help='posts per index/category page (default: 0, all on one page)')
+    serve_parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, metavar='SECONDS',
+                              help=f'how often to check for changes (default: {WATCH_INTERVAL})')
+    serve_parser.set_defaults(func=cmd_serve, profile=False)
+
+    plan_parser = commands.add_parser('deploy-plan', help='list the files that changed since the last deploy')
+    deploy_plan.add_arguments(plan_parser)
+    plan_parser.set_defaults(func=deploy_plan.run, profile=False)
+
+    args = parser.parse_args()
+    profiling.start(args)
+    args.func(args)
+    profiling.finish(args)
+
+if __name__ == '__main__':
+    main()
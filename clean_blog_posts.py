@@ -2,43 +2,93 @@
 """
 Clean up blog post titles and formatting
 - Remove category tags from titles
-- Remove excessive HTML formatting (bold, italics, quotes) while preserving images
+- Remove excessive HTML formatting (bold, italics) while preserving images
 - Maintain category metadata
+The same cleanup runs inside blogspot_to_html as CLEAN_STAGES; this script
+is for trees converted before that.
 """
 
+import argparse
 import os
 import re
+import time
 from pathlib import Path
 
+from generate_blog_index import listing_page_names
+from minify import TAG_ATTRS
+from render import post_body_span, sync_outputs, write_chunks
+import profiling
+
 def clean_title(title):
     """Remove category tags from title"""
     # Remove patterns like [Paper Review - NLP], [Book Summary, NLP], etc.
     cleaned = re.sub(r'^\[.*?\]\s*', '', title)
     return cleaned.strip()
 
+# Single-pass tokenizer: comments and script/style bodies are matched whole
+# so they are copied through untouched; <strong>, <em>, <b> and <i> open and
+# close tags (with or without attributes) are matched on their own, and every
+# other start tag is matched whole and kept. Tags use minify's attribute
+# pattern, so a quoted '>' (<b title="a>b">) or '<b>' (alt="<b>") stays
+# inside its tag. Each tag is handled independently, so nesting never causes
+# backtracking.
+FORMATTING_TOKEN_RE = re.compile(
+    r'<!--.*?-->'
+    r'|<(?:script|style)\b' + TAG_ATTRS + r'>.*?</(?:script|style)\s*>'
+    r'|<(?P<fmt>/?(?:strong|em|b|i))(?:\s' + TAG_ATTRS + r')?/?>'
+    r'|<[a-zA-Z]' + TAG_ATTRS + r'>',
+    re.DOTALL | re.IGNORECASE
+)
+
+def iter_without_formatting(content):
+    """Yield content in chunks, minus <strong>, <em>, <b> and <i> tags
+
+    One left-to-right pass over the tokens; the text between dropped tags
+    (images, figures, links and all other markup) is yielded unchanged.
+    """
+    pos = 0
+    for match in FORMATTING_TOKEN_RE.finditer(content):
+        if match.group('fmt'):
+            yield content[pos:match.start()]
+            pos = match.end()
+    yield content[pos:]
+
 def clean_html_formatting(content):
     """Remove excessive formatting but preserve images, links, and structure"""
-    # Don't touch img tags, figure tags
-    # Remove <strong>, <em>, <b>, <i> tags but keep content
+    return ''.join(iter_without_formatting(content))
 
-    # Skip if content has images - we'll be more careful with those
-    has_images = '<img' in content or '<figure' in content
+def clean_title_stage(post):
+    """Pipeline stage: remove category tags from the post title"""
+    post['title'] = clean_title(post['title'])
+    return post
 
-    if not has_images:
-        # Safe to do simple replacements
-        content = re.sub(r'<strong>(.*?)</strong>', r'\1', content, flags=re.DOTALL)
-        content = re.sub(r'<em>(.*?)</em>', r'\1', content, flags=re.DOTALL)
-        content = re.sub(r'<b>(.*?)</b>', r'\1', content, flags=re.DOTALL)
-        content = re.sub(r'<i>(.*?)</i>', r'\1', content, flags=re.DOTALL)
+def clean_formatting_stage(post):
+    """Pipeline stage: remove excessive formatting from the post content"""
+    post['content'] = clean_html_formatting(post['content'] or '')
+    return post
 
-    return content
+# Stages blogspot_to_html runs on each post dict before rendering, so freshly
+# converted trees never need the file-rewriting pass below
+CLEAN_STAGES = (clean_title_stage, clean_formatting_stage)
 
 def process_blog_post(filepath):
     """Process a single blog post"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
+    with profiling.stage('read'):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+    with profiling.stage('clean'):
+        cleaned = clean_post_page(content)
+
+    # Only write if changed
+    if cleaned != content:
+        with profiling.stage('write'):
+            write_chunks(filepath, [cleaned])
+        return True
+    return False
 
-    original_content = content
+def clean_post_page(content):
+    """Clean the title and body of a rendered post page"""
 
     # Extract h1 title
     h1_match = re.search(r'<h1>(.*?)</h1>', content, re.DOTALL)
@@ -58,29 +108,26 @@ def process_blog_post(filepath):
                 content = content.replace(f'<title>{old_page_title}</title>',
                                         f'<title>{new_page_title}</title>')
 
-    # Clean formatting (conservative approach - only if no images)
-    content = clean_html_formatting(content)
-
-    # Only write if changed
-    if content != original_content:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        return True
-    return False
+    # Clean formatting in the post body only, leaving the page's own markup
+    # (such as <strong>Categories:</strong>) alone
+    body_span = post_body_span(content)
+    if body_span:
+        start, end = body_span
+        content = content[:start] + clean_html_formatting(content[start:end]) + content[end:]
+    else:
+        content = clean_html_formatting(content)
+    return content
 
 def main():
+    parser = argparse.ArgumentParser(description='Clean titles and formatting of converted blog posts')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
     blog_dir = Path('blog')
 
-    # Category pages to skip
-    skip_files = {
-        'paper-review.html', 'book-summary.html', 'book-review.html',
-        'speech-technology.html', 'algorithm.html', 'aesthetics.html',
-        'nlp.html', 'phonology.html', 'psycholinguistics.html',
-        'graduate-research.html', 'information-theory.html', 'python-code.html',
-        'nlp-code.html', 'philosophy.html', 'bash-code.html', 'ctdsi.html',
-        'data.html', 'leetcode.html', 'mac-os.html', 'nlu.html', 'perl-code.html',
-        'phonetics.html'
-    }
+    # Category pages are rendered by generate_blog_index, not converted
+    skip_files = listing_page_names(blog_dir)
 
     modified_count = 0
 
@@ -88,11 +135,17 @@ def main():
         if html_file.name in skip_files:
             continue
 
-        if process_blog_post(html_file):
+        start = time.perf_counter()
+        modified = process_blog_post(html_file)
+        profiling.record_item(html_file.name, time.perf_counter() - start, start)
+        if modified:
             modified_count += 1
             print(f'✓ Cleaned {html_file.name}')
+    sync_outputs()
 
     print(f'\n✓ Modified {modified_count} files')
 
+    profiling.finish(args)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Plan a minimal upload of the built site
+- Every servable file (including the .gz/.br siblings) is hashed and
+  compared with the manifest of the last deployed build
+  (.build/deployed.json)
+- The added, changed and deleted files are listed with their sha256 and
+  size, as text or JSON
+- --tarball packs just the added and changed files, plus DEPLOY-PLAN.json
+  naming the files to delete on the server; a tarball written inside the
+  site is recorded in the manifest and left out of every later plan
+- --mark-deployed records the current build as deployed; run it once the
+  upload has succeeded
+Files whose size and mtime match the manifest are not re-hashed, so
+planning a deploy costs one stat per file plus reading what changed.
+"""
+
+from datetime import datetime, timezone
+import argparse
+import io
+import json
+import os
+import tarfile
+from pathlib import Path
+
+from precompress import file_hash, iter_site_files
+from render import read_state, write_state
+
+DEPLOY_MANIFEST_PATH = '.build/deployed.json'
+DEPLOY_MANIFEST_VERSION = 1
+# Name of the plan inside a delta tarball
+PLAN_MEMBER = 'DEPLOY-PLAN.json'
+
+def load_deploy_manifest(manifest_path=DEPLOY_MANIFEST_PATH):
+    """The last deploy: its 'files' {path: {'sha256', 'size', 'mtime_ns'}} and 'exclude' paths"""
+    manifest = read_state(manifest_path, {})
+    if manifest.get('version') != DEPLOY_MANIFEST_VERSION:
+        return {'files': {}, 'exclude': []}
+    manifest.setdefault('exclude', [])
+    return manifest
+
+def save_deploy_manifest(files, manifest_path=DEPLOY_MANIFEST_PATH, exclude=(), deployed_at=None):
+    """Record files as the deployed build, and paths never to deploy"""
+    if deployed_at is None:
+        deployed_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    write_state(manifest_path, {'version': DEPLOY_MANIFEST_VERSION, 'deployed_at': deployed_at,
+                                'files': files, 'exclude': sorted(exclude)},
+                ensure_ascii=False, indent=1, sort_keys=True)
+
+def scan_site(root='.', known=None, exclude=()):
+    """Hash and size of every servable file, by site-relative path
+
+    Hashes in known (a deploy manifest) are reused for files whose size and
+    mtime still match. Paths in exclude are left out.
+    """
+    root = Path(root)
+    known = known or {}
+    files = {}
+    for rel_path in iter_site_files(root, compressed=True):
+        key = rel_path.as_posix()
+        if key in exclude:
+            continue
+        path = root / rel_path
+        stat = path.stat()
+        entry = known.get(key)
+        if entry is None or entry['size'] != stat.st_size or entry.get('mtime_ns') != stat.st_mtime_ns:
+            entry = {'sha256': file_hash(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        files[key] = entry
+    return files
+
+def deploy_plan(current, deployed):
+    """Compare two {path: entry} maps; returns added, changed and deleted entries"""
+    plan = {'added': [], 'changed': [], 'deleted': []}
+    for path, entry in sorted(current.items()):
+        old = deployed.get(path)
+        if old is None:
+            plan['added'].append({'path': path, 'sha256': entry['sha256'], 'size': entry['size']})
+        elif old['sha256'] != entry['sha256']:
+            plan['changed'].append({'path': path, 'sha256': entry['sha256'], 'size': entry['size'],
+                                    'previous_sha256': old['sha256'], 'previous_size': old['size']})
+    for path, old in sorted(deployed.items()):
+        if path not in current:
+            plan['deleted'].append({'path': path, 'sha256': old['sha256'], 'size': old['size']})
+    return plan
+
+def upload_size(plan):
+    """Bytes that have to be uploaded for plan"""
+    return sum(entry['size'] for entry in plan['added'] + plan['changed'])
+
+def write_tarball(plan, tarball_path, root='.'):
+    """Pack the added and changed files and the plan into a .tar.gz
+
+    Returns the number of files packed.
+    """
+    root = Path(root)
+    uploads = plan['added'] + plan['changed']
+    Path(tarball_path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tarball_path).with_name(Path(tarball_path).name + '.tmp')
+    with tarfile.open(tmp_path, 'w:gz') as tar:
+        data = json.dumps(plan, ensure_ascii=False, indent=1).encode('utf-8')
+        info = tarfile.TarInfo(PLAN_MEMBER)
+        info.size = len(data)
+        info.mtime = int(datetime.now(timezone.utc).timestamp())
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(data))
+        for entry in uploads:
+            info = tar.gettarinfo(root / entry['path'], arcname=entry['path'])
+            # Ownership on the build machine means nothing on the server
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            with open(root / entry['path'], 'rb') as f:
+                tar.addfile(info, f)
+    os.replace(tmp_path, tarball_path)
+    return len(uploads)
+
+def print_plan(plan):
+    """One line per file: status, size, sha256, path"""
+    for status, key in (('A', 'added'), ('M', 'changed'), ('D', 'deleted')):
+        for entry in plan[key]:
+            print(f"{status} {entry['size']:>10} {entry['sha256']} {entry['path']}")
+
+def add_arguments(parser):
+    """Options of the deploy-plan command"""
+    parser.add_argument('--root', default='.', help='site root (default: current directory)')
+    parser.add_argument('--manifest', default=DEPLOY_MANIFEST_PATH,
+                        help=f'manifest of the last deployed build (default: {DEPLOY_MANIFEST_PATH})')
+    parser.add_argument('--json', action='store_true', help='print the plan as JSON')
+    parser.add_argument('--tarball', metavar='PATH',
+                        help='write the added and changed files to a .tar.gz delta')
+    parser.add_argument('--mark-deployed', action='store_true',
+                        help='record the current build as deployed (after a successful upload)')
+
+def run(args):
+    """Print the plan, then write the tarball and manifest as asked"""
+    root = Path(args.root)
+    manifest_path = root / args.manifest
+    manifest = load_deploy_manifest(manifest_path)
+    deployed = manifest['files']
+    exclude = set(manifest['exclude'])
+    if args.tarball and Path(args.tarball).resolve().is_relative_to(root.resolve()):
+        # A delta written into the site must not become part of it, on this
+        # run or any later one
+        exclude.add(Path(args.tarball).resolve().relative_to(root.resolve()).as_posix())
+    current = scan_site(root, deployed, exclude)
+    plan = deploy_plan(current, deployed)
+
+    if args.json:
+        print(json.dumps(plan, ensure_ascii=False, indent=1))
+    else:
+        if not deployed:
+            print(f"No deploy manifest at {manifest_path}; every file counts as added")
+        print_plan(plan)
+        print(f"\n✓ {len(plan['added'])} added, {len(plan['changed'])} changed, "
+              f"{len(plan['deleted'])} deleted, {len(current)} files in the build; "
+              f"{upload_size(plan)} bytes to upload")
+
+    if args.tarball:
+        packed = write_tarball(plan, args.tarball, root)
+        if not args.json:
+            print(f"✓ Wrote {args.tarball} ({packed} files, {os.path.getsize(args.tarball)} bytes)")
+    if args.mark_deployed:
+        save_deploy_manifest(current, manifest_path, exclude)
+        if not args.json:
+            print(f"✓ Recorded {len(current)} files as deployed in {manifest_path}")
+    elif exclude != set(manifest['exclude']):
+        save_deploy_manifest(deployed, manifest_path, exclude, manifest.get('deployed_at'))
+    return plan
+
+def main():
+    parser = argparse.ArgumentParser(description='List the files that changed since the last deploy')
+    add_arguments(parser)
+    run(parser.parse_args())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+"""
+Local preview server (python build.py serve)
+- Posts, the index and category pages and search.html are rendered on
+  request from the parsed export and the compiled templates, both held in
+  memory; nothing is written to disk
+- Everything else (index.html, css, js, images, feeds, the search index) is
+  served from the working tree, using a precompressed .br/.gz sibling when
+  the client accepts it and the sibling is at least as new as the file;
+  files that are not part of the site (dot-paths, sources, the export) are
+  not served
+- Every response carries an ETag and If-None-Match is answered with 304
+- HTML pages get a small script that listens on /__reload (server-sent
+  events) and reloads the page when the export, a template or a served
+  file changes
+"""
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+from xml.etree.ElementTree import ParseError
+
+from blogspot_to_html import apply_stages, clean_filename, iter_html_post, parse_blogspot_xml, post_index_record
+from generate_blog_index import (category_page_path, group_posts, index_page_path, iter_blog_index,
+                                 iter_category_page, metadata_from_index, paginate, root_prefix)
+from minify import minify_html
+from precompress import is_site_file
+from render import render_to_string
+import templating
+
+RELOAD_PATH = '/__reload'
+RELOAD_SCRIPT = (f'<script>new EventSource("{RELOAD_PATH}").onmessage = '
+                 '() => location.reload();</script>')
+# Keeps idle event streams open through proxies and notices closed tabs
+KEEPALIVE = 15
+# Content-Encoding -> sibling suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Served from disk but not watched for changes
+UNWATCHED_DIRS = {'.build', '.git', '__pycache__', 'blog', 'search'}
+
+class Site:
+    """The parsed export and the pages rendered from it so far"""
+
+    def __init__(self, xml_file, stages=(), per_page=0, minify=False):
+        self.xml_file = xml_file
+        self.stages = stages
+        self.per_page = per_page
+        self.minify = minify
+        self.lock = threading.Lock()
+        self.posts = []
+        self.routes = {}
+        self.rendered = {}
+        self.generation = 0
+        self.changed = threading.Condition()
+
+    def load(self, parse=True):
+        """(Re)build the routes; parse=False keeps the posts already in memory"""
+        if parse:
+            self.posts = parse_blogspot_xml(self.xml_file)
+        # Compile now so a broken template is reported by the watcher
+        templating.load_templates()
+        routes = {}
+        records = {}
+        for source_post in self.posts:
+            filename = clean_filename(source_post['title']) + '.html'
+            post = apply_stages(source_post, self.stages)
+            # Later posts with the same filename win, as on disk
+            records.pop(filename, None)
+            records[filename] = post_index_record(post, filename, None)
+            routes[f'blog/{filename}'] = lambda post=post: iter_html_post(
+                post['title'], post['date'], post['content'], post['labels'], post['url'])
+
+        all_posts, posts_by_category = group_posts(
+            sorted((filename, metadata_from_index(record)) for filename, record in records.items()))
+        pages = paginate(all_posts, self.per_page)
+        for page, page_posts in enumerate(pages, 1):
+            routes[index_page_path(page)] = (
+                lambda page_posts=page_posts, page=page, total=len(pages):
+                iter_blog_index(page_posts, page, total))
+        for category, posts in posts_by_category.items():
+            pages = paginate(posts, self.per_page)
+            for page, page_posts in enumerate(pages, 1):
+                routes[category_page_path(category, page)] = (
+                    lambda category=category, page_posts=page_posts, page=page, total=len(pages):
+                    iter_category_page(category, page_posts, page, total))
+        routes['search.html'] = lambda: templating.get_template('search.html').render(
+            {'root': root_prefix('search.html')})
+
+        with self.lock:
+            self.routes = routes
+            self.rendered = {}
+        return len(records)
+
+    def page(self, path):
+        """(body, etag) of an in-memory page, or None if path is not one"""
+        with self.lock:
+            cached = self.rendered.get(path)
+            render = self.routes.get(path)
+        if cached is not None or render is None:
+            return cached
+        page = render_to_string(render())
+        if self.minify:
+            page = minify_html(page)
+        body = inject_reload(page.encode('utf-8'))
+        cached = (body, f'"{hashlib.sha256(body).hexdigest()[:20]}"')
+        with self.lock:
+            self.rendered[path] = cached
+        return cached
+
+    def notify(self):
+        """Tell every open /__reload stream to reload"""
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+
+def inject_reload(body):
+    """Add the live-reload script to an HTML page"""
+    script = RELOAD_SCRIPT.encode('utf-8')
+    end = body.rfind(b'</body>')
+    if end == -1:
+        return body + script
+    return body[:end] + script + body[end:]
+
+def input_stats(xml_file, root='.'):
+    """(mtime, size) of the export, the templates and the files served from disk
+
+    Keys are paths relative to the working directory.
+    """
+    stats = {}
+    try:
+        stat = os.stat(xml_file)
+        stats[os.path.relpath(xml_file)] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    for top in (templating.TEMPLATE_DIR, Path(root)):
+        for directory, dirs, files in os.walk(top):
+            dirs[:] = [name for name in dirs if name not in UNWATCHED_DIRS]
+            for name in files:
+                if name.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stats[os.path.relpath(path)] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+def watch_inputs(site, interval):
+    """Poll the inputs forever, refreshing the site and signalling reloads"""
+    seen = input_stats(site.xml_file)
+    while True:
+        time.sleep(interval)
+        current = input_stats(site.xml_file)
+        changed = {path for path in seen.keys() | current.keys() if seen.get(path) != current.get(path)}
+        seen = current
+        if not changed:
+            continue
+        started = time.perf_counter()
+        try:
+            if any(Path(path).resolve().is_relative_to(templating.TEMPLATE_DIR) for path in changed):
+                templating.clear_templates()
+            site.load(parse=os.path.relpath(site.xml_file) in changed)
+        except (OSError, ParseError, templating.TemplateError) as e:
+            # Keep serving the last good state until the input is fixed
+            print(f"✗ Reload failed: {e}")
+            continue
+        site.notify()
+        names = ', '.join(sorted(changed)[:3])
+        more = f" and {len(changed) - 3} more" if len(changed) > 3 else ""
+        print(f"✓ {names}{more} changed, reloaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+class PreviewHandler(BaseHTTPRequestHandler):
+    """Serves one request from the in-memory site or the working tree"""
+
+    site = None
+    root = Path('.').resolve()
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        path = unquote(urlsplit(self.path).path)
+        if path == RELOAD_PATH:
+            self.stream_reloads()
+            return
+        path = path.lstrip('/')
+        if path == '' or path.endswith('/'):
+            path += 'index.html'
+
+        try:
+            page = self.site.page(path)
+        except templating.TemplateError as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+            return
+        if page is not None:
+            body, etag = page
+            encoding = None
+            if self.accepts('gzip'):
+                body, encoding = gzip.compress(body, compresslevel=6, mtime=0), 'gzip'
+                etag = etag[:-1] + '-gz"'
+            self.send_body(body, 'text/html; charset=utf-8', etag, encoding, send_body)
+            return
+
+        file_path = (self.root / path).resolve()
+        # Only what would be deployed: not .git, .build, the export or sources
+        if (not file_path.is_relative_to(self.root) or not file_path.is_file()
+                or not is_site_file(file_path.relative_to(self.root), self.root)):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        self.send_file(file_path, send_body)
+
+    def accepts(self, encoding):
+        accepted = self.headers.get('Accept-Encoding', '')
+        return any(part.split(';')[0].strip() == encoding for part in accepted.split(','))
+
+    def send_file(self, file_path, send_body):
+        content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+        if content_type == 'text/html':
+            # Pages from disk still need the reload script, so no precompressed variant
+            body = inject_reload(file_path.read_bytes())
+            etag = f'"{hashlib.sha256(body).hexdigest()[:20]}"'
+            self.send_body(body, 'text/html; charset=utf-8', etag, None, send_body)
+            return
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+
+        stat = file_path.stat()
+        served, encoding = file_path, None
+        for name, suffix in ENCODINGS:
+            sibling = file_path.with_name(file_path.name + suffix)
+            if self.accepts(name) and sibling.exists() and sibling.stat().st_mtime_ns >= stat.st_mtime_ns:
+                served, encoding = sibling, name
+                break
+        # Derived from the original, so the variant changes whenever the file does
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}"' if encoding else '"')
+        if self.not_modified(etag):
+            return
+        self.send_body(served.read_bytes(), content_type, etag, encoding, send_body, check=False)
+
+    def not_modified(self, etag):
+        """Answer 304 if the client already has etag"""
+        tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if etag not in tags and '*' not in tags:
+            return False
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        return True
+
+    def send_body(self, body, content_type, etag, encoding, send_body, check=True):
+        if check and self.not_modified(etag):
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        # Revalidate every time so edits show up at once
+        self.send_header('Cache-Control', 'no-cache')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def stream_reloads(self):
+        """Hold the connection open and send an event after each change"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        site = self.site
+        with site.changed:
+            generation = site.generation
+        try:
+            while True:
+                with site.changed:
+                    site.changed.wait_for(lambda: site.generation != generation, timeout=KEEPALIVE)
+                    current = site.generation
+                if current != generation:
+                    generation = current
+                    self.wfile.write(b'data: reload\n\n')
+                else:
+                    self.wfile.write(b': keepalive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        # The event stream and 304s would drown out the rebuild messages
+        pass
+
+def serve(xml_file, stages=(), per_page=0, minify=False, host='127.0.0.1', port=8000, interval=0.2):
+    """Load the export and serve the site until interrupted"""
+    site = Site(xml_file, stages, per_page, minify)
+    print(f"Parsing {xml_file}...")
+    count = site.load()
+    print(f"✓ {count} posts in memory")
+
+    PreviewHandler.site = site
+    server = ThreadingHTTPServer((host, port), PreviewHandler)
+    server.daemon_threads = True
+    threading.Thread(target=watch_inputs, args=(site, interval), daemon=True).start()
+    print(f"\nServing on http://{host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n✓ Stopped serving")
+    finally:
+        server.server_close()
@@ -0,0 +1,185 @@
+"""
+Atom, RSS and JSON Feed output for the blog
+- feed.xml (Atom), rss.xml and feed.json hold the newest posts
+- feeds/<category>.xml holds the full archive of each category
+Every entry carries a hash of its content (from the sidecar index, or of the
+page itself); a feed is only rewritten when the hashes it is built from
+change, so static hosts keep serving the same Last-Modified/ETag.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from urllib.parse import quote, urljoin
+from xml.sax.saxutils import escape, quoteattr
+
+from render import SITE_AUTHOR, SITE_URL, extract_post_body, read_state, sync_outputs, write_chunks, write_state
+
+FEED_STATE_PATH = '.build/feeds.json'
+FEED_SIZE = 20
+FEED_TITLE = f'Blog - {SITE_AUTHOR}'
+# Bump when the feed layout changes so every feed is rewritten once
+FEED_VERSION = 1
+
+RELATIVE_LINK_RE = re.compile(r'\b(src|href)="(?!(?:[a-z][a-z0-9+.-]*:|#|/))([^"]*)"', re.IGNORECASE)
+
+def site_url(path):
+    """Absolute URL of a site-relative path"""
+    return f"{SITE_URL}/{quote(path)}"
+
+def post_url(post, blog_dir='blog'):
+    """Absolute URL of a post page"""
+    return site_url(f"{blog_dir}/{post['filename']}")
+
+def absolutize_links(body, base_url):
+    """Make relative src/href attributes absolute so feed readers can follow them"""
+    return RELATIVE_LINK_RE.sub(lambda m: f'{m.group(1)}="{urljoin(base_url, m.group(2))}"', body)
+
+def load_feed_state(state_path=FEED_STATE_PATH):
+    """Load {feed path: etag} from the previous run"""
+    return read_state(state_path, {})
+
+def save_feed_state(state, state_path=FEED_STATE_PATH):
+    """Persist feed etags for the next run"""
+    write_state(state_path, state, indent=1, sort_keys=True)
+
+def feed_etag(kind, title, posts):
+    """Stable hash of a feed: its format, title and the entries' content hashes"""
+    payload = json.dumps([FEED_VERSION, kind, title,
+                          [[post['filename'], post['hash']] for post in posts]])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _parse_time(value):
+    """ISO timestamp -> aware datetime (naive values are taken as UTC)"""
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def _iso(value):
+    return _parse_time(value).isoformat()
+
+def _entries(posts, blog_dir):
+    """Yield (post, url, body html) with links made absolute"""
+    for post in posts:
+        url = post_url(post, blog_dir)
+        with open(Path(blog_dir) / post['filename'], 'r', encoding='utf-8') as f:
+            body = extract_post_body(f.read())
+        yield post, url, absolutize_links(body, url)
+
+def _feed_updated(posts):
+    if not posts:
+        return datetime(1970, 1, 1, tzinfo=timezone.utc).isoformat()
+    return max(_parse_time(post['updated']) for post in posts).isoformat()
+
+def iter_atom(title, self_path, posts, blog_dir='blog'):
+    """Yield an Atom feed in chunks"""
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+    yield f'  <title>{escape(title)}</title>\n'
+    yield f'  <link href={quoteattr(site_url("blog.html"))}/>\n'
+    yield f'  <link rel="self" href={quoteattr(site_url(self_path))}/>\n'
+    yield f'  <id>{escape(site_url(self_path))}</id>\n'
+    yield f'  <updated>{_feed_updated(posts)}</updated>\n'
+    yield f'  <author><name>{escape(SITE_AUTHOR)}</name></author>\n'
+    for post, url, body in _entries(posts, blog_dir):
+        yield '  <entry>\n'
+        yield f'    <title>{escape(post["title"])}</title>\n'
+        yield f'    <link href={quoteattr(url)}/>\n'
+        yield f'    <id>{escape(url)}</id>\n'
+        yield f'    <published>{_iso(post["published"])}</published>\n'
+        yield f'    <updated>{_iso(post["updated"])}</updated>\n'
+        for label in post['labels']:
+            yield f'    <category term={quoteattr(label)}/>\n'
+        yield f'    <content type="html">{escape(body)}</content>\n'
+        yield '  </entry>\n'
+    yield '</feed>\n'
+
+def iter_rss(title, self_path, posts, blog_dir='blog'):
+    """Yield an RSS 2.0 feed in chunks"""
+    yield '<?xml version="1.0" encoding="utf-8"?>\n'
+    yield '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n'
+    yield '  <channel>\n'
+    yield f'    <title>{escape(title)}</title>\n'
+    yield f'    <link>{escape(site_url("blog.html"))}</link>\n'
+    yield f'    <description>{escape(f"Blog posts by {SITE_AUTHOR}")}</description>\n'
+    yield f'    <atom:link href={quoteattr(site_url(self_path))} rel="self" type="application/rss+xml"/>\n'
+    yield f'    <lastBuildDate>{format_datetime(_parse_time(_feed_updated(posts)))}</lastBuildDate>\n'
+    for post, url, body in _entries(posts, blog_dir):
+        yield '    <item>\n'
+        yield f'      <title>{escape(post["title"])}</title>\n'
+        yield f'      <link>{escape(url)}</link>\n'
+        yield f'      <guid isPermaLink="true">{escape(url)}</guid>\n'
+        yield f'      <pubDate>{format_datetime(_parse_time(post["published"]))}</pubDate>\n'
+        for label in post['labels']:
+            yield f'      <category>{escape(label)}</category>\n'
+        yield f'      <description>{escape(body)}</description>\n'
+        yield '    </item>\n'
+    yield '  </channel>\n'
+    yield '</rss>\n'
+
+def iter_json_feed(title, self_path, posts, blog_dir='blog'):
+    """Yield a JSON Feed 1.1 document in chunks (one item per chunk)"""
+    header = json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': site_url('blog.html'),
+        'feed_url': site_url(self_path),
+        'authors': [{'name': SITE_AUTHOR}]
+    }, ensure_ascii=False, indent=1)
+    yield header[:-2] + ',\n "items": ['
+    for i, (post, url, body) in enumerate(_entries(posts, blog_dir)):
+        item = json.dumps({
+            'id': url,
+            'url': url,
+            'title': post['title'],
+            'content_html': body,
+            'date_published': _iso(post['published']),
+            'date_modified': _iso(post['updated']),
+            'tags': post['labels']
+        }, ensure_ascii=False)
+        yield (',\n  ' if i else '\n  ') + item
+    yield '\n ]\n}\n'
+
+def write_feeds(all_posts, posts_by_category, blog_dir='blog', feed_size=FEED_SIZE,
+                state_path=FEED_STATE_PATH, force=False, only=None):
+    """Write the site feeds and per-category archives whose entries changed
+
+    With only (a set of feed paths), other existing feeds are assumed to be
+    unchanged. Returns the list of feed paths that were written.
+    """
+    old_state = load_feed_state(state_path) if state_path else {}
+    new_state = {}
+    written = []
+
+    def emit(path, kind, title, posts, render):
+        if only is not None and path not in only and path in old_state:
+            new_state[path] = old_state[path]
+            return
+        etag = feed_etag(kind, title, posts)
+        new_state[path] = etag
+        if not force and old_state.get(path) == etag and Path(path).exists():
+            return
+        if write_chunks(path, render(title, path, posts, blog_dir)):
+            written.append(path)
+
+    newest = all_posts[:feed_size]
+    emit('feed.xml', 'atom', FEED_TITLE, newest, iter_atom)
+    emit('rss.xml', 'rss', FEED_TITLE, newest, iter_rss)
+    emit('feed.json', 'json', FEED_TITLE, newest, iter_json_feed)
+
+    for category, posts in sorted(posts_by_category.items()):
+        title = f"{category.replace('-', ' ').title()} - {FEED_TITLE}"
+        emit(f'feeds/{category}.xml', 'atom', title, posts, iter_atom)
+
+    for path in sorted(old_state.keys() - new_state.keys()):
+        if Path(path).exists():
+            os.remove(path)
+
+    sync_outputs()
+    if state_path:
+        save_feed_state(new_state, state_path)
+
+    return written
@@ -3,11 +3,107 @@
 Generate blog index and category pages from converted blog posts
 """
 
+import argparse
+import hashlib
+import html
+import json
 import os
+import posixpath
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 import re
 
+from render import read_state, render_to_string, sync_outputs, write_chunks, write_state
+import minify
+import profiling
+from templating import get_template, templates_fingerprint
+from search_index import build_search_index
+from feeds import FEED_SIZE, write_feeds
+from sitemap import format_lastmod, page_lastmod, write_sitemap
+
+# Sidecar metadata written by blogspot_to_html, one JSON object per post
+POST_INDEX_PATH = '.build/posts.jsonl'
+# Signatures of the listing pages written by the previous run
+PAGE_STATE_PATH = '.build/pages.json'
+# Written into the <head> of every page rendered from templates/category.html
+# and templates/post.html respectively
+LISTING_MARKER = b'<meta name="generator-page" content="listing">'
+POST_MARKER = b'<meta name="generator-page" content="post">'
+GENERATOR_MARKER_WINDOW = 4096
+# Closes every page rendered from templates/post.html
+POST_META_MARKER = b'<p class="post-meta">'
+# What each listing page, feed and the sitemap was last built from
+GRAPH_PATH = '.build/graph.json'
+GRAPH_VERSION = 1
+INDEX_PAGE = 'blog.html'
+SEARCH_PAGE = 'search.html'
+
+def make_preview(content_html):
+    """Strip tags from a post body and cut it down to a preview"""
+    preview = re.sub(r'<[^>]+>', '', content_html.strip())
+    return preview[:200].strip() + '...' if len(preview) > 200 else preview
+
+def categories_from_title(title, categories):
+    """Add categories encoded in the title (e.g., [Paper Review - NLP])"""
+    # Match patterns like [Paper Review - X] or [Book Summary - X]
+    title_cats = re.findall(r'\[(Paper Review|Book Summary|Book Review|Algorithm|Speech Technology|NLP|Psycholinguistics)[^\]]*\]', title, re.IGNORECASE)
+    for cat in title_cats:
+        # Extract the main category
+        main_cat = cat.split('-')[0].strip() if '-' in cat else cat
+        if main_cat not in categories:
+            categories.append(main_cat)
+    return categories
+
+def load_post_index(index_path=POST_INDEX_PATH):
+    """Load the sidecar metadata index as {filename: record}"""
+    return {record['filename']: record for record in read_state(index_path, [], json_lines=True)}
+
+def write_post_index(records, index_path=POST_INDEX_PATH):
+    """Write sidecar metadata records as JSON Lines, atomically"""
+    write_state(index_path, records, json_lines=True, ensure_ascii=False)
+
+def index_entry_is_current(record, filepath):
+    """Check that the HTML file is still the one the index entry describes"""
+    try:
+        stat = filepath.stat()
+    except FileNotFoundError:
+        return False
+    return record.get('mtime_ns') == stat.st_mtime_ns and record.get('size') == stat.st_size
+
+def rewrite_post_file(filepath, rewrite, index):
+    """Run rewrite(filepath) for an in-place post-processing step
+
+    If the file's index entry was current before, it is updated to the new
+    size and mtime so the next scan can keep using the index. Returns what
+    rewrite returned.
+    """
+    filepath = Path(filepath)
+    record = index.get(filepath.name)
+    current = record is not None and index_entry_is_current(record, filepath)
+    result = rewrite(filepath)
+    if current:
+        stat = filepath.stat()
+        record['mtime_ns'] = stat.st_mtime_ns
+        record['size'] = stat.st_size
+    return result
+
+def metadata_from_index(record):
+    """Build the same metadata extract_metadata_from_html returns from an index record"""
+    date = datetime.fromisoformat(record['date'])
+    return {
+        'title': record['title'],
+        'date': date.strftime("%B %d, %Y"),
+        'categories': categories_from_title(record['title'], list(record['labels'])),
+        'preview': record['preview'],
+        'labels': record['labels'],
+        'published': record['date'],
+        'updated': record.get('updated', record['date']),
+        # The index hash only covers the export; the page's size and mtime
+        # change whenever a later step (localize, images, minify) rewrites
+        # it, so feeds and the dependency graph follow those edits too
+        'hash': f"{record['hash']}:{record.get('mtime_ns')}:{record.get('size')}"
+    }
+
 def extract_metadata_from_html(filepath):
     """Extract title and date from HTML file"""
     with open(filepath, 'r', encoding='utf-8') as f:
@@ -15,219 +111,538 @@ def extract_metadata_from_html(filepath):
 
     # Extract title
     title_match = re.search(r'<h1>(.*?)</h1>', content)
-    title = title_match.group(1) if title_match else 'Untitled'
+    title = html.unescape(title_match.group(1)) if title_match else 'Untitled'
 
     # Extract date
     date_match = re.search(r'<p class="post-date">(.*?)</p>', content)
     date_str = date_match.group(1) if date_match else ''
 
     # Extract categories from metadata
-    categories_match = re.search(r'<strong>Categories:</strong>\s*(.*?)</p>', content, re.DOTALL)
+    # Older clean_blog_posts runs stripped the <strong> around the label
+    categories_match = re.search(r'(?:<strong>)?Categories:(?:</strong>)?\s*(.*?)</p>', content, re.DOTALL)
     categories = []
     if categories_match:
         cat_text = categories_match.group(1)
-        categories = [c.strip() for c in cat_text.split(',')]
+        categories = [html.unescape(c.strip()) for c in cat_text.split(',')]
 
     # Also extract categories from title (e.g., [Paper Review - NLP])
     if title:
-        # Match patterns like [Paper Review - X] or [Book Summary - X]
-        title_cats = re.findall(r'\[(Paper Review|Book Summary|Book Review|Algorithm|Speech Technology|NLP|Psycholinguistics)[^\]]*\]', title, re.IGNORECASE)
-        for cat in title_cats:
-            # Extract the main category
-            main_cat = cat.split('-')[0].strip() if '-' in cat else cat
-            if main_cat not in categories:
-                categories.append(main_cat)
+        categories_from_title(title, categories)
 
     # Extract first 200 chars of content for preview
     content_match = re.search(r'<h1>.*?</p>\s*(.*?)\s*<p class="post-meta">', content, re.DOTALL)
     preview = ''
     if content_match:
-        preview_html = content_match.group(1)
-        # Remove HTML tags for preview
-        preview = re.sub(r'<[^>]+>', '', preview_html)
-        preview = preview[:200].strip() + '...' if len(preview) > 200 else preview
+        preview = make_preview(content_match.group(1))
+
+    # Only the day is known from the page itself
+    try:
+        published = datetime.strptime(date_str, "%B %d, %Y").replace(tzinfo=timezone.utc).isoformat()
+    except ValueError:
+        published = datetime.fromtimestamp(os.path.getmtime(filepath), timezone.utc).isoformat()
 
     return {
         'title': title,
         'date': date_str,
         'categories': categories,
-        'preview': preview
+        'preview': preview,
+        'labels': list(categories),
+        'published': published,
+        'updated': published,
+        'hash': hashlib.sha256(content.encode('utf-8')).hexdigest()
     }
 
-def categorize_posts(blog_dir='blog'):
-    """Scan blog directory and categorize posts"""
-    blog_path = Path(blog_dir)
-    posts_by_category = {}
-    all_posts = []
+def post_info_from_metadata(filename, metadata):
+    """Listing entry for a post, as used by the index, feeds and search"""
+    return {
+        'filename': filename,
+        'title': metadata['title'],
+        'date': metadata['date'],
+        'preview': metadata['preview'],
+        'labels': metadata['labels'],
+        'published': metadata['published'],
+        'updated': metadata['updated'],
+        'hash': metadata['hash']
+    }
 
-    for html_file in blog_path.glob('*.html'):
-        if html_file.name in ['book-summaries.html', 'paper-reviews.html', 'speech-technology.html']:
+def category_keys(metadata):
+    """Category page names a post is listed under"""
+    return [category.lower().replace(' ', '-') for category in metadata['categories']]
+
+def post_sort_key(post):
+    """Sort key for newest-first listings (undated posts go last)"""
+    try:
+        return datetime.strptime(post['date'], "%B %d, %Y")
+    except ValueError:
+        return datetime.min
+
+def is_listing_page(filepath):
+    """True if filepath is a listing page rather than a post
+
+    Pages rendered from templates/category.html carry LISTING_MARKER in their
+    <head>; ones written before the marker existed lack the post-meta
+    paragraph every post ends with. No build state is involved, so a fresh
+    clone or a deleted .build/ tells them apart just the same.
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(GENERATOR_MARKER_WINDOW)
+            if LISTING_MARKER in head:
+                return True
+            if POST_MARKER in head:
+                return False
+            return POST_META_MARKER not in head + f.read()
+    except FileNotFoundError:
+        return False
+
+def listing_page_names(blog_dir='blog'):
+    """Files in blog_dir that are listing pages rather than posts"""
+    return {path.name for path in Path(blog_dir).glob('*.html') if is_listing_page(path)}
+
+def is_generated_page(rel_path, root='.', blog_dir='blog'):
+    """True for the pages this script and blogspot_to_html write (site-relative path)
+
+    A page in blog_dir counts only if it carries the post or listing marker,
+    so posts added there by hand are not mistaken for converted ones.
+    """
+    rel_path = Path(rel_path)
+    if rel_path.as_posix() in (INDEX_PAGE, SEARCH_PAGE):
+        return True
+    if rel_path.parts[:1] != (blog_dir,):
+        return False
+    try:
+        with open(Path(root) / rel_path, 'rb') as f:
+            head = f.read(GENERATOR_MARKER_WINDOW)
+    except FileNotFoundError:
+        return False
+    return POST_MARKER in head or LISTING_MARKER in head
+
+def categorize_posts(blog_dir='blog', index_path=POST_INDEX_PATH, index=None):
+    """Scan blog directory and categorize posts
+
+    Metadata comes from the sidecar index where it is current; only posts
+    without an up-to-date index entry are parsed from their HTML. Category
+    pages are recognized by their marker and skipped. Pass index
+    (records by filename) to use records already in memory.
+    """
+    blog_path = Path(blog_dir)
+    entries = []
+    if index is None:
+        index = load_post_index(index_path) if index_path else {}
+    scanned = 0
+
+    for html_file in sorted(blog_path.glob('*.html')):
+        record = index.get(html_file.name)
+        if record is not None and index_entry_is_current(record, html_file):
+            # Only the converter writes index records, and only for posts
+            metadata = metadata_from_index(record)
+        elif is_listing_page(html_file):
             continue
+        else:
+            metadata = extract_metadata_from_html(html_file)
+            scanned += 1
+        entries.append((html_file.name, metadata))
+
+    if scanned:
+        print(f"Parsed {scanned} post(s) without a current index entry")
 
-        metadata = extract_metadata_from_html(html_file)
+    return group_posts(entries)
 
-        post_info = {
-            'filename': html_file.name,
-            'title': metadata['title'],
-            'date': metadata['date'],
-            'preview': metadata['preview']
-        }
+def group_posts(entries):
+    """Newest-first listings from (filename, metadata) pairs in filename order
 
+    Returns all posts and the posts of each category.
+    """
+    posts_by_category = {}
+    all_posts = []
+    for filename, metadata in entries:
+        post_info = post_info_from_metadata(filename, metadata)
         all_posts.append(post_info)
 
         # Categorize
-        for category in metadata['categories']:
-            cat_key = category.lower().replace(' ', '-')
+        for cat_key in category_keys(metadata):
             if cat_key not in posts_by_category:
                 posts_by_category[cat_key] = []
             posts_by_category[cat_key].append(post_info)
 
     # Sort all posts by date (newest first)
-    def parse_date(date_str):
-        try:
-            return datetime.strptime(date_str, "%B %d, %Y")
-        except:
-            return datetime.min
-
-    all_posts.sort(key=lambda x: parse_date(x['date']), reverse=True)
+    all_posts.sort(key=post_sort_key, reverse=True)
 
     for cat in posts_by_category:
-        posts_by_category[cat].sort(key=lambda x: parse_date(x['date']), reverse=True)
+        posts_by_category[cat].sort(key=post_sort_key, reverse=True)
 
     return all_posts, posts_by_category
 
-def generate_blog_index(all_posts):
-    """Generate main blog index page"""
-    html = """<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta name="description" content="Blog posts by Cheonkam Jeong">
-    <title>Blog - Cheonkam Jeong</title>
-    <link rel="stylesheet" href="css/style.css">
-</head>
-<body>
-    <h1>Blog</h1>
-
-    <!-- Categories -->
-    <p style="margin-bottom: 2rem;">
-        <strong>Categories:</strong>
-        <a href="blog/book-summaries.html">Book Summaries</a> |
-        <a href="blog/paper-reviews.html">Paper Reviews</a> |
-        <a href="blog/speech-technology.html">Speech Technology</a> |
-        <a href="blog/algorithm.html">Algorithm</a> |
-        <a href="blog/aesthetics.html">Aesthetics</a> |
-        <a href="blog/nlp.html">NLP</a>
-    </p>
-
-    <!-- Blog posts listed in reverse chronological order -->
-"""
+def relative_url(page_path, target):
+    """Link to target (relative to the site root) from the page at page_path"""
+    return posixpath.relpath(target, posixpath.dirname(page_path) or '.')
+
+def index_page_path(page):
+    """Site-relative path of a main index page"""
+    return INDEX_PAGE if page == 1 else f'blog/page/{page}.html'
+
+def category_page_path(category_name, page):
+    """Site-relative path of a category page"""
+    if page == 1:
+        return f'blog/{category_name}.html'
+    return f'blog/{category_name}/page/{page}.html'
+
+def paginate(posts, per_page):
+    """Split posts into pages of per_page posts (a single page if per_page is 0)"""
+    if not per_page or per_page <= 0:
+        return [posts]
+    return [posts[i:i + per_page] for i in range(0, len(posts), per_page)] or [[]]
+
+def root_prefix(page_path, directory='.'):
+    """Relative prefix from the page at page_path to a site directory"""
+    prefix = posixpath.relpath(directory, posixpath.dirname(page_path) or '.')
+    return '' if prefix == '.' else prefix + '/'
+
+def listing_context(posts, page, total_pages, page_path, path_for_page):
+    """Template context shared by the index and category listings"""
+    return {
+        'root': root_prefix(page_path),
+        'blog_root': root_prefix(page_path, 'blog'),
+        'posts': posts,
+        'page': page,
+        'total_pages': total_pages,
+        'paginated': total_pages > 1,
+        'newer_url': relative_url(page_path, path_for_page(page - 1)) if page > 1 else None,
+        'older_url': relative_url(page_path, path_for_page(page + 1)) if page < total_pages else None
+    }
 
-    for post in all_posts:
-        html += f"""
-    <div class="blog-post">
-        <h2><a href="blog/{post['filename']}">{post['title']}</a></h2>
-        <p class="post-date">{post['date']}</p>
-        <p>
-            {post['preview']}
-        </p>
-    </div>
-"""
+def iter_blog_index(all_posts, page=1, total_pages=1):
+    """Yield the main blog index page in chunks"""
+    context = listing_context(all_posts, page, total_pages,
+                              index_page_path(page), index_page_path)
+    return get_template('index.html').render(context)
 
-    html += """
-    <!-- Navigation -->
-    <nav>
-        <ul>
-            <li><a href="index.html">Home</a></li>
-            <li><a href="publications.html">Publications</a></li>
-            <li><a href="blog.html" class="active">Blog</a></li>
-        </ul>
-    </nav>
-
-    <!-- Footer -->
-    <footer>
-        <p>&copy; 2025 Cheonkam Jeong. Last updated: October 2025.</p>
-    </footer>
-</body>
-</html>
-"""
-    return html
+def generate_blog_index(all_posts, page=1, total_pages=1):
+    """Generate main blog index page"""
+    return render_to_string(iter_blog_index(all_posts, page, total_pages))
+
+def iter_category_page(category_name, posts, page=1, total_pages=1):
+    """Yield a category page in chunks"""
+    context = listing_context(posts, page, total_pages,
+                              category_page_path(category_name, page),
+                              lambda n: category_page_path(category_name, n))
+    context['category_title'] = category_name.replace('-', ' ').title()
+    return get_template('category.html').render(context)
 
-def generate_category_page(category_name, posts):
+def generate_category_page(category_name, posts, page=1, total_pages=1):
     """Generate a category page"""
-    category_title = category_name.replace('-', ' ').title()
-
-    html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{category_title} - Cheonkam Jeong</title>
-    <link rel="stylesheet" href="../css/style.css">
-</head>
-<body>
-    <h1>{category_title}</h1>
-
-    <p><a href="../blog.html">← Back to all posts</a></p>
-"""
+    return render_to_string(iter_category_page(category_name, posts, page, total_pages))
+
+def load_page_state(state_path=PAGE_STATE_PATH):
+    """Load {page path: signature} recorded by the previous run"""
+    return read_state(state_path, {})
+
+def save_page_state(state, state_path=PAGE_STATE_PATH):
+    """Persist page signatures for the next run"""
+    write_state(state_path, state, ensure_ascii=False, indent=1, sort_keys=True)
+
+def page_signature(posts, page, total_pages, templates=''):
+    """Hash of everything a listing page shows, plus the templates it uses"""
+    payload = json.dumps([
+        templates,
+        page,
+        total_pages,
+        [[p['filename'], p['title'], p['date'], p['preview']] for p in posts]
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def write_listing_pages(all_posts, posts_by_category, per_page=0,
+                        state_path=PAGE_STATE_PATH, force=False, minify_pages=False, only=None):
+    """Write the index and category pages whose post set changed
+
+    With only (a set of page paths), every other existing page is assumed
+    to be unchanged and is not even compared. Returns the (path, post count,
+    bytes saved by minification) tuples that were written and the total
+    number of pages.
+    """
+    old_state = load_page_state(state_path) if state_path else {}
+    new_state = {}
+    written = []
+    templates = templates_fingerprint()
+    if minify_pages:
+        templates += ':minify'
+
+    def emit(path, page_posts, page, total_pages, render):
+        if only is not None and path not in only and path in old_state:
+            new_state[path] = old_state[path]
+            return
+        signature = page_signature(page_posts, page, total_pages, templates)
+        new_state[path] = signature
+        if not force and old_state.get(path) == signature and Path(path).exists():
+            return
+
+        if minify_pages:
+            before, after, changed = minify.write_minified(path, render(page_posts, page, total_pages))
+            if changed:
+                written.append((path, len(page_posts), before - after))
+        elif write_chunks(path, render(page_posts, page, total_pages)):
+            written.append((path, len(page_posts), 0))
+
+    pages = paginate(all_posts, per_page)
+    for page, page_posts in enumerate(pages, 1):
+        emit(index_page_path(page), page_posts, page, len(pages), iter_blog_index)
 
-    for post in posts:
-        html += f"""
-    <div class="blog-post">
-        <h2><a href="{post['filename']}">{post['title']}</a></h2>
-        <p class="post-date">{post['date']}</p>
-        <p>
-            {post['preview']}
-        </p>
-    </div>
-"""
+    for category, posts in posts_by_category.items():
+        pages = paginate(posts, per_page)
+        for page, page_posts in enumerate(pages, 1):
+            emit(category_page_path(category, page), page_posts, page, len(pages),
+                 lambda ps, n, total, category=category: iter_category_page(category, ps, n, total))
+
+    # Drop pages that no longer exist (fewer pages, or a category went away)
+    for path in sorted(old_state.keys() - new_state.keys()):
+        if Path(path).exists():
+            os.remove(path)
+            print(f"✓ Removed {path}")
+            try:
+                # Clean up blog/<category>/page/ once it is empty
+                os.removedirs(Path(path).parent)
+            except OSError:
+                pass
+
+    # Pages must be on disk before their signatures say so
+    sync_outputs()
+    if state_path:
+        save_page_state(new_state, state_path)
+
+    return written, len(new_state)
+
+def _digest(*values):
+    payload = json.dumps(values, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def output_graph(all_posts, posts_by_category, per_page=0, feed_size=FEED_SIZE, minify_pages=False,
+                 pages=True, feeds=True, sitemap=True):
+    """Dependency graph nodes for the site outputs, by output path
+
+    Each node lists the inputs the output is built from, as [name, digest]
+    edges in output order: posts (digesting only the fields that output
+    shows), the labels a category page is built from, and the templates.
+    """
+    graph = {}
+    templates = templates_fingerprint() + (':minify' if minify_pages else '')
+
+    def listing(kind, posts, path_for_page, label=None):
+        # Index and category pages show title, date and preview
+        digests = {post['filename']: _digest(post['title'], post['date'], post['preview'])
+                   for post in posts}
+        chunks = paginate(posts, per_page)
+        for page, page_posts in enumerate(chunks, 1):
+            graph[path_for_page(page)] = {
+                'kind': kind, 'label': label, 'templates': templates, 'pages': len(chunks),
+                'inputs': [[post['filename'], digests[post['filename']]] for post in page_posts]}
+
+    if pages:
+        listing('index', all_posts, index_page_path)
+        for category, posts in posts_by_category.items():
+            listing('category', posts, lambda page, category=category: category_page_path(category, page),
+                    category)
+
+    if feeds:
+        # Feed entries carry the whole post, so they follow its content hash
+        newest = [[post['filename'], post['hash']] for post in all_posts[:feed_size]]
+        for path in ('feed.xml', 'rss.xml', 'feed.json'):
+            graph[path] = {'kind': 'feed', 'inputs': newest}
+        for category, posts in posts_by_category.items():
+            graph[f'feeds/{category}.xml'] = {
+                'kind': 'feed', 'label': category,
+                'inputs': [[post['filename'], post['hash']] for post in posts]}
+
+    if sitemap:
+        graph['sitemap.xml'] = {
+            'kind': 'sitemap',
+            'inputs': [[path, str(lastmod)] for path, lastmod
+                       in iter_sitemap_entries(all_posts, posts_by_category, per_page)]}
+
+    return graph
+
+def load_graph(graph_path=GRAPH_PATH):
+    """Load the dependency graph saved by the previous run ({} if none)"""
+    graph = read_state(graph_path, {})
+    return graph['outputs'] if graph.get('version') == GRAPH_VERSION else {}
+
+def save_graph(outputs, graph_path=GRAPH_PATH):
+    """Persist the dependency graph for the next run"""
+    write_state(graph_path, {'version': GRAPH_VERSION, 'outputs': outputs}, ensure_ascii=False, sort_keys=True)
+
+def invalidate_graph(graph_path=GRAPH_PATH):
+    """Forget the graph after outputs were written outside write_site_pages"""
+    try:
+        os.remove(graph_path)
+    except FileNotFoundError:
+        pass
+
+def _names(names, limit=3):
+    names = list(names)
+    more = f" and {len(names) - limit} more" if len(names) > limit else ""
+    return ', '.join(names[:limit]) + more
+
+def stale_reason(old, new, path):
+    """Why the output at path has to be rebuilt, or None if it is up to date"""
+    if old is None:
+        return "new output"
+    if not os.path.exists(path):
+        return "missing on disk"
+    if old.get('templates') != new.get('templates'):
+        return "templates changed"
+    if old.get('pages') != new.get('pages'):
+        return f"page count {old.get('pages')} -> {new.get('pages')}"
+
+    old_inputs, new_inputs = dict(old['inputs']), dict(new['inputs'])
+    added = [name for name in new_inputs if name not in old_inputs]
+    removed = [name for name in old_inputs if name not in new_inputs]
+    reasons = []
+    if added:
+        reasons.append(f"added {_names(added)}")
+    if removed:
+        reasons.append(f"removed {_names(removed)}")
+    changed = [name for name, digest in new_inputs.items()
+               if name in old_inputs and old_inputs[name] != digest]
+    if changed:
+        reasons.append(f"changed {_names(changed)}")
+    if not reasons and old['inputs'] != new['inputs']:
+        reasons.append("order changed")
+    if reasons and new.get('label'):
+        reasons[0] = f"label '{new['label']}' {reasons[0]}"
+    return '; '.join(reasons) or None
+
+def stale_outputs(old_graph, new_graph):
+    """{path: reason} for every output whose inputs changed since old_graph"""
+    stale = {}
+    for path, node in new_graph.items():
+        reason = stale_reason(old_graph.get(path), node, path)
+        if reason:
+            stale[path] = reason
+    return stale
+
+def iter_sitemap_entries(all_posts, posts_by_category, per_page=0, blog_dir='blog'):
+    """Yield (site-relative path, lastmod) for every page in the sitemap"""
+    for page in ('index.html', 'publications.html'):
+        if os.path.exists(page):
+            yield page, page_lastmod(page)
+
+    def newest(posts):
+        return max((post['updated'] for post in posts),
+                   key=lambda value: format_lastmod(value), default=None)
+
+    for page, page_posts in enumerate(paginate(all_posts, per_page), 1):
+        yield index_page_path(page), newest(page_posts)
+    for category, posts in sorted(posts_by_category.items()):
+        for page, page_posts in enumerate(paginate(posts, per_page), 1):
+            yield category_page_path(category, page), newest(page_posts)
 
-    html += """
-    <!-- Navigation -->
-    <nav>
-        <ul>
-            <li><a href="../index.html">Home</a></li>
-            <li><a href="../publications.html">Publications</a></li>
-            <li><a href="../blog.html" class="active">Blog</a></li>
-        </ul>
-    </nav>
-
-    <!-- Footer -->
-    <footer>
-        <p>&copy; 2025 Cheonkam Jeong. Last updated: October 2025.</p>
-    </footer>
-</body>
-</html>
-"""
-    return html
+    for post in all_posts:
+        yield f"{blog_dir}/{post['filename']}", post['updated']
+
+def write_search_page(path=SEARCH_PAGE):
+    """Write the static search page if its content changed"""
+    return write_chunks(path, get_template('search.html').render({'root': root_prefix(path)}))
+
+def write_site_pages(all_posts, posts_by_category, per_page=0, force=False, minify_pages=False,
+                     feed_size=FEED_SIZE, pages=True, feeds=True, sitemap=True, search=True,
+                     explain=False, graph_path=GRAPH_PATH):
+    """Write the listing pages, feeds, sitemap and search index for the posts
+
+    Only outputs whose inputs changed since the saved dependency graph are
+    looked at; explain prints the reason for each of them.
+    """
+    with profiling.stage('graph'):
+        old_graph = load_graph(graph_path) if graph_path else {}
+        graph = output_graph(all_posts, posts_by_category, per_page, feed_size, minify_pages,
+                             pages, feeds, sitemap)
+        stale = {path: "forced" for path in graph} if force else stale_outputs(old_graph, graph)
+    if explain:
+        print(f"\n{len(stale)} of {len(graph)} output(s) out of date" + (":" if stale else ""))
+        if not old_graph and not force:
+            print("  (no dependency graph from a previous run)")
+        for path, reason in sorted(stale.items()):
+            print(f"  {path}: {reason}")
+    # Without a previous graph every output is new; compare them all
+    only = set(stale) if old_graph else None
+
+    if pages:
+        print("\nGenerating blog index and category pages...")
+        with profiling.stage('listing pages'):
+            written, total_pages = write_listing_pages(all_posts, posts_by_category, per_page=per_page,
+                                                       force=force, minify_pages=minify_pages, only=only)
+        for path, count, saved in written:
+            print(f"✓ Created {path} ({count} posts" + (f", minified, saved {saved} bytes)" if minify_pages else ")"))
+        print(f"✓ {len(written)} page(s) written, {total_pages - len(written)} unchanged")
+        if minify_pages and written:
+            print(f"✓ Minification saved {sum(saved for _, _, saved in written)} bytes")
+
+    if feeds:
+        print("\nWriting feeds...")
+        with profiling.stage('feeds'):
+            feed_files = write_feeds(all_posts, posts_by_category, feed_size=feed_size, force=force, only=only)
+        for path in feed_files:
+            print(f"✓ Created {path}")
+        if not feed_files:
+            print("✓ Feeds unchanged")
+
+    if sitemap and (only is None or 'sitemap.xml' in only):
+        with profiling.stage('sitemap'):
+            sitemaps = write_sitemap(iter_sitemap_entries(all_posts, posts_by_category, per_page))
+        for path in sitemaps:
+            print(f"✓ Created {path}")
+
+    if search:
+        print("\nBuilding search index...")
+        with profiling.stage('search index'):
+            written, total_files = build_search_index(all_posts)
+        if write_search_page():
+            print(f"✓ Created {SEARCH_PAGE}")
+        print(f"✓ {written} of {total_files} search index file(s) updated")
+
+    if graph_path:
+        # Keep the nodes of outputs that were not part of this run
+        kinds = {kind for kind, run in (('index', pages), ('category', pages), ('feed', feeds),
+                                        ('sitemap', sitemap)) if run}
+        kept = {path: node for path, node in old_graph.items() if node['kind'] not in kinds}
+        save_graph({**kept, **graph}, graph_path)
 
 def main():
+    parser = argparse.ArgumentParser(description='Generate blog index and category pages')
+    parser.add_argument('--per-page', type=int, default=0, metavar='N',
+                        help='posts per index/category page (default: 0, all on one page)')
+    parser.add_argument('--force', action='store_true',
+                        help='rewrite every page even if its post set is unchanged')
+    parser.add_argument('--minify', action='store_true',
+                        help='minify the index and category pages (see minify.py)')
+    parser.add_argument('--feed-size', type=int, default=FEED_SIZE, metavar='N',
+                        help=f'posts in feed.xml, rss.xml and feed.json (default: {FEED_SIZE})')
+    parser.add_argument('--no-feeds', action='store_true',
+                        help='do not write the Atom/RSS/JSON feeds')
+    parser.add_argument('--no-sitemap', action='store_true',
+                        help='do not write sitemap.xml')
+    parser.add_argument('--no-search', action='store_true',
+                        help='do not build the search index and search.html')
+    parser.add_argument('--explain', action='store_true',
+                        help='print why each listing page, feed and sitemap is rebuilt')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.start(args)
+
     print("Scanning blog posts...")
-    all_posts, posts_by_category = categorize_posts()
+    with profiling.stage('scan'):
+        all_posts, posts_by_category = categorize_posts()
 
     print(f"Found {len(all_posts)} posts in {len(posts_by_category)} categories")
 
-    # Generate main blog index
-    print("\nGenerating blog.html...")
-    blog_html = generate_blog_index(all_posts)
-    with open('blog.html', 'w', encoding='utf-8') as f:
-        f.write(blog_html)
-    print("✓ Created blog.html")
-
-    # Generate category pages
-    print("\nGenerating category pages...")
-    for category, posts in posts_by_category.items():
-        category_file = f'blog/{category}.html'
-        category_html = generate_category_page(category, posts)
-        with open(category_file, 'w', encoding='utf-8') as f:
-            f.write(category_html)
-        print(f"✓ Created {category_file} ({len(posts)} posts)")
+    write_site_pages(all_posts, posts_by_category, per_page=args.per_page, force=args.force,
+                     minify_pages=args.minify, feed_size=args.feed_size, feeds=not args.no_feeds,
+                     sitemap=not args.no_sitemap, search=not args.no_search, explain=args.explain)
 
     print("\n✓ All done!")
     print("\nCategory breakdown:")
     for category, posts in sorted(posts_by_category.items()):
         print(f"  - {category}: {len(posts)} posts")
 
+    profiling.finish(args)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Responsive image derivatives for the site
+- Local JPEG/PNG/WebP images referenced by <img> in blog posts and index.html
+  are resized to WIDTHS (never upscaled) in their own format and as WebP
+- In generated pages the <img> tag gets srcset, sizes, explicit
+  width/height and loading="lazy", wrapped in a <picture> with a WebP <source>
+- Hand-maintained pages (index.html, posts added to blog/ by hand) keep their
+  markup and original src; only srcset and sizes are added, and a srcset made
+  of derivatives is recomputed from src, so a replaced image is picked up
+- Derivatives are cached by the source image's hash, so each image is only
+  processed once no matter how many pages use it
+Needs Pillow; without it pages are left unchanged. Remote images are not
+touched (run localize_assets.py first to bring them on-site).
+"""
+
+import argparse
+import html
+import os
+import re
+from pathlib import Path
+from urllib.parse import unquote
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+import generate_blog_index
+from minify import ATTR_RE
+from precompress import file_hash
+from render import read_state, sync_outputs, write_chunks, write_state
+
+IMAGE_CACHE_PATH = '.build/images.json'
+DERIVED_DIR = 'images/derived'
+WIDTHS = (360, 720, 1440)
+# Width the browser should assume before layout; the content column is 800px
+DEFAULT_SIZES = '(max-width: 800px) 100vw, 800px'
+SIZES_BY_CLASS = {'profile-img': '240px'}
+# Pillow format -> (extension, save options)
+FORMATS = {
+    'JPEG': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'PNG': ('png', {'optimize': True}),
+    'WEBP': ('webp', {'quality': 80, 'method': 6}),
+}
+
+IMG_TAG_RE = re.compile(r'<img\b(?:"[^"]*"|\'[^\']*\'|[^\'">])*>', re.IGNORECASE)
+REMOTE_SRC_RE = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|//)', re.IGNORECASE)
+
+def load_image_cache(cache_path=IMAGE_CACHE_PATH):
+    """Load {source hash: derivative info} from previous runs"""
+    return read_state(cache_path, {})
+
+def save_image_cache(cache, cache_path=IMAGE_CACHE_PATH):
+    """Persist the derivative cache"""
+    write_state(cache_path, cache, indent=1, sort_keys=True)
+
+def target_widths(width):
+    """Bucket widths for an image, capped at its own width"""
+    return sorted({min(bucket, width) for bucket in WIDTHS})
+
+def _save_variant(image, path, fmt):
+    ext, options = FORMATS[fmt]
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    tmp_path = path.with_name(path.name + '.tmp')
+    image.save(tmp_path, fmt, **options)
+    os.replace(tmp_path, path)
+
+def build_derivatives(source, digest, out_dir=DERIVED_DIR):
+    """Resize source into every bucket width, in its own format and WebP
+
+    Returns the cache entry, or None if the file is not a supported image.
+    """
+    try:
+        with Image.open(source) as opened:
+            fmt = opened.format
+            if fmt not in FORMATS or getattr(opened, 'is_animated', False):
+                return None
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+    except (OSError, ValueError):
+        return None
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    width, height = image.size
+    variants = {}
+    for target_fmt in dict.fromkeys((fmt, 'WEBP')):
+        ext = FORMATS[target_fmt][0]
+        variants[ext] = []
+        for target in target_widths(width):
+            resized = image if target == width else image.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS)
+            path = out_dir / f'{digest[:16]}-{target}.{ext}'
+            _save_variant(resized, path, target_fmt)
+            variants[ext].append([target, path.as_posix()])
+
+    return {'width': width, 'height': height, 'format': FORMATS[fmt][0], 'variants': variants}
+
+def derivatives_for(source, cache, out_dir=DERIVED_DIR):
+    """Cached derivative info for a local image file (None if unsupported)"""
+    digest = file_hash(source)
+    entry = cache.get(digest)
+    if entry is not None and not entry['variants']:
+        # Remembered as unsupported
+        return None
+    if entry is not None and all(os.path.exists(path) for variants in entry['variants'].values()
+                                 for _, path in variants):
+        return entry
+
+    entry = build_derivatives(source, digest, out_dir)
+    cache[digest] = entry or {'variants': {}}
+    return entry
+
+def _srcset(variants, page_dir):
+    return ', '.join(f'{Path(os.path.relpath(path, page_dir)).as_posix()} {width}w'
+                     for width, path in variants)
+
+def is_derived_srcset(srcset, page_dir, out_dir=DERIVED_DIR):
+    """True if every candidate in srcset is a derivative in out_dir"""
+    derived = os.path.abspath(out_dir)
+    for candidate in html.unescape(srcset.strip('"\'')).split(','):
+        url = candidate.split()[0] if candidate.strip() else ''
+        if REMOTE_SRC_RE.match(url):
+            return False
+        if os.path.dirname(os.path.abspath(Path(page_dir) / unquote(url))) != derived:
+            return False
+    return True
+
+def _join_attrs(order, attrs, values, drop=()):
+    """<img> with values replacing or added to the original attributes"""
+    parts = []
+    for key, name in order:
+        if key in drop:
+            continue
+        value = values.pop(key, attrs[key])
+        parts.append(name if value is None else f'{name}={value}')
+    parts.extend(f'{key}={value}' for key, value in values.items())
+    return '<img ' + ' '.join(parts) + '>'
+
+def responsive_img(tag, page_dir, cache, out_dir=DERIVED_DIR, keep_src=False):
+    """Rewrite one <img> tag (returned unchanged if it cannot be improved)
+
+    With keep_src (hand-maintained pages) src and the rest of the tag are
+    kept: only srcset and sizes are set, and an existing srcset is replaced
+    (or dropped, once src no longer has derivatives) only if it consists of
+    derivatives.
+    """
+    attrs = {}
+    order = []
+    for match in ATTR_RE.finditer(tag[len('<img'):-1]):
+        key = match.group(1).lower()
+        if key not in attrs:
+            attrs[key] = match.group(2)
+            order.append((key, match.group(1)))
+    if not attrs.get('src'):
+        return tag
+    refresh = 'srcset' in attrs
+    if refresh and not (keep_src and is_derived_srcset(attrs['srcset'] or '', page_dir, out_dir)):
+        return tag
+
+    src = html.unescape(attrs['src'].strip('"\''))
+    source = Path(page_dir) / unquote(src.split('#')[0].split('?')[0])
+    entry = None
+    if not REMOTE_SRC_RE.match(src) and source.is_file():
+        entry = derivatives_for(source, cache, out_dir)
+    if entry is None:
+        return _join_attrs(order, attrs, {}, drop={'srcset'}) if refresh else tag
+
+    own = entry['variants'][entry['format']]
+    fallback = [path for width, path in own if width <= WIDTHS[1]] or [own[0][1]]
+    classes = (attrs.get('class') or '').strip('"\'').split()
+    sizes = next((SIZES_BY_CLASS[c] for c in classes if c in SIZES_BY_CLASS), DEFAULT_SIZES)
+    if keep_src:
+        return _join_attrs(order, attrs, {'srcset': f'"{_srcset(own, page_dir)}"',
+                                          'sizes': attrs.get('sizes') or f'"{sizes}"'})
+
+    # Keep the display size Blogger recorded; otherwise use the intrinsic size
+    width = (attrs.get('width') or '').strip('"\'')
+    height = (attrs.get('height') or '').strip('"\'')
+    if not width and not height:
+        width, height = str(entry['width']), str(entry['height'])
+    elif not height and width.isdigit():
+        height = str(round(int(width) * entry['height'] / entry['width']))
+    elif not width and height.isdigit():
+        width = str(round(int(height) * entry['width'] / entry['height']))
+
+    values = {
+        'src': f'"{Path(os.path.relpath(fallback[-1], page_dir)).as_posix()}"',
+        'srcset': f'"{_srcset(own, page_dir)}"',
+        'sizes': f'"{sizes}"',
+        'width': f'"{width}"',
+        'height': f'"{height}"',
+        'loading': attrs.get('loading') or '"lazy"',
+        'decoding': attrs.get('decoding') or '"async"',
+    }
+    img = _join_attrs(order, attrs, values)
+
+    if 'webp' not in entry['variants'] or entry['format'] == 'webp':
+        return img
+    return (f'<picture><source type="image/webp" srcset="{_srcset(entry["variants"]["webp"], page_dir)}" '
+            f'sizes="{sizes}">{img}</picture>')
+
+def process_page(path, cache, out_dir=DERIVED_DIR, keep_src=False):
+    """Rewrite the <img> tags of one HTML page in place; returns images rewritten"""
+    with open(path, 'r', encoding='utf-8') as f:
+        page = f.read()
+
+    count = 0
+    def rewrite(match):
+        nonlocal count
+        new_tag = responsive_img(match.group(0), Path(path).parent, cache, out_dir, keep_src)
+        count += new_tag != match.group(0)
+        return new_tag
+
+    new_page = IMG_TAG_RE.sub(rewrite, page)
+    if count:
+        write_chunks(path, [new_page])
+    return count
+
+def process_site(blog_dir='blog', index=None, cache_path=IMAGE_CACHE_PATH):
+    """Rewrite the images of every post and index.html; returns tags rewritten
+
+    index (the sidecar records, by filename) is kept in step with the posts.
+    Pages the generators did not write keep their original src. Without
+    Pillow nothing is touched.
+    """
+    if Image is None:
+        print("Pillow is not installed; leaving images unchanged (pip install Pillow)")
+        return 0
+
+    cache = load_image_cache(cache_path)
+    pages = sorted(Path(blog_dir).glob('*.html'))
+    if os.path.exists('index.html'):
+        pages.append(Path('index.html'))
+
+    total = 0
+    for path in pages:
+        keep_src = not generate_blog_index.is_generated_page(path, blog_dir=blog_dir)
+        count = generate_blog_index.rewrite_post_file(
+            path, lambda page: process_page(page, cache, keep_src=keep_src),
+            (index or {}) if path.parent == Path(blog_dir) else {})
+        if count:
+            total += count
+            print(f"✓ {path}: {count} image(s)")
+
+    sync_outputs()
+    save_image_cache(cache, cache_path)
+    print(f"✓ Rewrote {total} image tag(s); {len(cache)} source image(s) in the cache")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate responsive image derivatives and srcset markup')
+    parser.add_argument('--blog-dir', default='blog', help='directory with the post pages (default: blog)')
+    parser.add_argument('--index', default=generate_blog_index.POST_INDEX_PATH,
+                        help='sidecar metadata index to keep in sync '
+                             f'(default: {generate_blog_index.POST_INDEX_PATH})')
+    args = parser.parse_args()
+
+    index = generate_blog_index.load_post_index(args.index)
+    if process_site(args.blog_dir, index) and index:
+        generate_blog_index.write_post_index(index.values(), args.index)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+// Client for the static index written by search_index.py.
+// Tokenization must match search_index.tokenize().
+(function () {
+    var BASE = 'search/';
+    var MAX_RESULTS = 20;
+    var cache = {};
+
+    function fetchJSON(path) {
+        if (!cache[path]) {
+            cache[path] = fetch(BASE + path).then(function (response) {
+                return response.ok ? response.json() : null;
+            });
+        }
+        return cache[path];
+    }
+
+    function isHangul(ch) {
+        return ch >= '가' && ch <= '힣';
+    }
+
+    function tokenize(text) {
+        var runs = text.normalize('NFKC').toLowerCase().match(/[0-9a-z]+|[가-힣]+/g) || [];
+        var terms = [];
+        runs.forEach(function (run) {
+            if (isHangul(run[0])) {
+                if (run.length === 1) terms.push(run);
+                for (var i = 0; i < run.length - 1; i++) terms.push(run.slice(i, i + 2));
+            } else if (run.length > 1) {
+                terms.push(run);
+            }
+        });
+        return terms.filter(function (term, i) { return terms.indexOf(term) === i; });
+    }
+
+    // 32-bit FNV-1a over the code points, as search_index.term_hash()
+    function termHash(term) {
+        var hash = 0x811c9dc5;
+        for (var i = 0; i < term.length; i++) {
+            hash = Math.imul(hash ^ term.charCodeAt(i), 0x01000193) >>> 0;
+        }
+        return hash;
+    }
+
+    function decode(deltas) {
+        var ids = [], current = 0;
+        deltas.forEach(function (delta) { current += delta; ids.push(current); });
+        return ids;
+    }
+
+    function search(query) {
+        var terms = tokenize(query);
+        if (!terms.length) return Promise.resolve([]);
+
+        return fetchJSON('meta.json').then(function (meta) {
+            return Promise.all(terms.map(function (term) {
+                var shard = termHash(term) % meta.term_shards;
+                return fetchJSON('terms/' + shard + '.json').then(function (postings) {
+                    return postings && postings[term] ? decode(postings[term]) : [];
+                });
+            })).then(function (lists) {
+                // Rank by number of matching terms, then newest first (lowest id)
+                var scores = {};
+                lists.forEach(function (ids) {
+                    ids.forEach(function (id) { scores[id] = (scores[id] || 0) + 1; });
+                });
+                var ids = Object.keys(scores).map(Number).sort(function (a, b) {
+                    return scores[b] - scores[a] || a - b;
+                }).slice(0, MAX_RESULTS);
+
+                return Promise.all(ids.map(function (id) {
+                    var page = Math.floor(id / meta.docs_per_shard);
+                    return fetchJSON('docs/' + page + '.json').then(function (docs) {
+                        return docs[id % meta.docs_per_shard];
+                    });
+                }));
+            });
+        });
+    }
+
+    function render(results, container, query) {
+        container.textContent = '';
+        if (!results.length) {
+            var empty = document.createElement('p');
+            empty.textContent = query ? 'No posts found.' : '';
+            container.appendChild(empty);
+            return;
+        }
+        results.forEach(function (doc) {
+            var item = document.createElement('div');
+            item.className = 'blog-post';
+            var heading = document.createElement('h2');
+            var link = document.createElement('a');
+            link.href = doc[1];
+            link.textContent = doc[0];
+            heading.appendChild(link);
+            var date = document.createElement('p');
+            date.className = 'post-date';
+            date.textContent = doc[2];
+            item.appendChild(heading);
+            item.appendChild(date);
+            container.appendChild(item);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var input = document.getElementById('search-input');
+        var container = document.getElementById('search-results');
+        var timer = null;
+
+        function run() {
+            var query = input.value;
+            search(query).then(function (results) {
+                if (input.value === query) render(results, container, query);
+            });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(run, 150);
+        });
+
+        var initial = new URLSearchParams(window.location.search).get('q');
+        if (initial) {
+            input.value = initial;
+            run();
+        }
+    });
+})();
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Bring remote post images on-site
+- Every remote <img src> in the converted posts is fetched once, concurrently
+  (asyncio with a bounded number of connections), into a content-addressed
+  cache: images/remote/<sha256>.<ext>
+- The posts are rewritten to point at the local copies (links to the same
+  URL, as Blogger wraps images in, are rewritten too)
+- Progress is saved in .build/assets.json while fetching, so an interrupted
+  run resumes where it stopped and no URL is ever fetched twice
+--source fetches from a local directory (<dir>/<host>/<path>) or a local
+HTTP server laid out the same way instead of the original hosts, for
+offline builds.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import hashlib
+import html
+import mimetypes
+import os
+import re
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlsplit
+
+import generate_blog_index
+from image_pipeline import IMG_TAG_RE
+from minify import ATTR_RE
+from render import read_state, sync_outputs, write_chunks, write_state
+
+ASSET_STATE_PATH = '.build/assets.json'
+REMOTE_ASSET_DIR = 'images/remote'
+CONNECTIONS = 8
+FETCH_TIMEOUT = 30
+# Save progress after this many finished downloads
+SAVE_EVERY = 20
+USER_AGENT = 'blog-asset-localizer/1.0'
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif',
+    'image/webp': 'webp', 'image/svg+xml': 'svg', 'image/avif': 'avif',
+}
+URL_ATTR_RE = re.compile(r'(\b(?:src|href)\s*=\s*)(["\'])(.*?)\2', re.IGNORECASE | re.DOTALL)
+
+def is_remote(url):
+    return urlsplit(url).scheme in ('http', 'https')
+
+def collect_remote_images(pages):
+    """Distinct remote image URLs used by pages, in first-seen order"""
+    urls = {}
+    for path in pages:
+        with open(path, 'r', encoding='utf-8') as f:
+            page = f.read()
+        for tag in IMG_TAG_RE.finditer(page):
+            for match in ATTR_RE.finditer(tag.group(0)[len('<img'):-1]):
+                if match.group(1).lower() == 'src' and match.group(2):
+                    url = html.unescape(match.group(2).strip('"\''))
+                    if is_remote(url):
+                        urls.setdefault(url, None)
+                    break
+    return list(urls)
+
+def source_location(url, source=None):
+    """Where to fetch url from: the URL itself, or its mirror under source"""
+    if source is None:
+        return url
+    parts = urlsplit(url)
+    relative = f'{parts.netloc}{parts.path}'
+    if is_remote(source):
+        return urljoin(source.rstrip('/') + '/', relative)
+    return str(Path(source) / unquote(relative))
+
+def fetch(location):
+    """Read a URL or local file; returns (bytes, content type or None)"""
+    if not is_remote(location):
+        with open(location, 'rb') as f:
+            return f.read(), mimetypes.guess_type(location)[0]
+    request = urllib.request.Request(location, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+        return response.read(), response.headers.get_content_type()
+
+def asset_extension(url, content_type):
+    """File extension for a fetched image"""
+    ext = CONTENT_TYPE_EXTENSIONS.get((content_type or '').lower())
+    if ext:
+        return ext
+    suffix = Path(urlsplit(url).path).suffix.lower().lstrip('.')
+    return {'jpeg': 'jpg'}.get(suffix, suffix) if suffix.isalnum() else 'bin'
+
+def store_asset(data, ext, asset_dir=REMOTE_ASSET_DIR):
+    """Write data under its content hash; returns the path"""
+    asset_path = Path(asset_dir)
+    asset_path.mkdir(parents=True, exist_ok=True)
+    target = asset_path / f'{hashlib.sha256(data).hexdigest()}.{ext}'
+    if not target.exists():
+        tmp = tempfile.NamedTemporaryFile(dir=asset_path, suffix='.part', delete=False)
+        with tmp:
+            tmp.write(data)
+        os.chmod(tmp.name, 0o644)
+        os.replace(tmp.name, target)
+    return target.as_posix()
+
+def load_asset_state(state_path=ASSET_STATE_PATH):
+    """Load {url: {'path': ...} or {'error': ...}} from previous runs"""
+    return read_state(state_path, {})
+
+def save_asset_state(state, state_path=ASSET_STATE_PATH):
+    """Persist fetch results atomically"""
+    write_state(state_path, state, ensure_ascii=False, indent=1, sort_keys=True)
+
+def pending_urls(urls, state, retry_failed=False):
+    """URLs that still need fetching"""
+    todo = []
+    for url in urls:
+        entry = state.get(url)
+        if entry is None:
+            todo.append(url)
+        elif 'path' in entry and not os.path.exists(entry['path']):
+            # Cache was cleared; the blob has to come from somewhere
+            todo.append(url)
+        elif 'error' in entry and retry_failed:
+            todo.append(url)
+    return todo
+
+async def fetch_all(urls, state, source=None, asset_dir=REMOTE_ASSET_DIR,
+                    connections=CONNECTIONS, state_path=ASSET_STATE_PATH):
+    """Fetch urls with at most `connections` in flight, recording each result"""
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(connections)
+    finished = 0
+
+    async def fetch_one(url, executor):
+        nonlocal finished
+        async with limit:
+            try:
+                data, content_type = await loop.run_in_executor(
+                    executor, fetch, source_location(url, source))
+                path = await loop.run_in_executor(
+                    executor, store_asset, data, asset_extension(url, content_type), asset_dir)
+                state[url] = {'path': path, 'size': len(data)}
+                print(f"✓ {url} -> {path}")
+            except (OSError, urllib.error.URLError, ValueError) as e:
+                state[url] = {'error': str(e)}
+                print(f"✗ {url}: {e}")
+        finished += 1
+        if state_path and finished % SAVE_EVERY == 0:
+            save_asset_state(state, state_path)
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        try:
+            await asyncio.gather(*(fetch_one(url, executor) for url in urls))
+        finally:
+            if state_path:
+                save_asset_state(state, state_path)
+
+def localize_page(path, state):
+    """Point remote URLs in a page at their local copies; returns URLs replaced"""
+    with open(path, 'r', encoding='utf-8') as f:
+        page = f.read()
+
+    page_dir = Path(path).parent
+    count = 0
+    def replace(match):
+        nonlocal count
+        entry = state.get(html.unescape(match.group(3)))
+        if entry is None or 'path' not in entry:
+            return match.group(0)
+        count += 1
+        local = Path(os.path.relpath(entry['path'], page_dir)).as_posix()
+        return f'{match.group(1)}{match.group(2)}{local}{match.group(2)}'
+
+    new_page = URL_ATTR_RE.sub(replace, page)
+    if count:
+        write_chunks(path, [new_page])
+    return count
+
+def localize_site(blog_dir='blog', index=None, source=None, asset_dir=REMOTE_ASSET_DIR,
+                  connections=CONNECTIONS, retry_failed=False, state_path=ASSET_STATE_PATH):
+    """Fetch what is missing and rewrite every post; returns URLs rewritten
+
+    index (the sidecar records, by filename) is kept in step with the posts.
+    """
+    pages = sorted(Path(blog_dir).glob('*.html'))
+    state = load_asset_state(state_path)
+    urls = collect_remote_images(pages)
+    todo = pending_urls(urls, state, retry_failed)
+    print(f"Found {len(urls)} remote images in {len(pages)} posts, {len(todo)} to fetch")
+
+    if todo:
+        asyncio.run(fetch_all(todo, state, source, asset_dir, connections, state_path))
+
+    replaced = 0
+    for path in pages:
+        count = generate_blog_index.rewrite_post_file(
+            path, lambda page: localize_page(page, state), index or {})
+        if count:
+            replaced += count
+            print(f"✓ Localized {count} URL(s) in {path}")
+    sync_outputs()
+
+    failed = sum(1 for url in urls if 'error' in state.get(url, {}))
+    print(f"✓ Rewrote {replaced} URL(s); {failed} image(s) could not be fetched")
+    return replaced
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch remote post images and serve them from the site')
+    parser.add_argument('--blog-dir', default='blog', help='directory with the post pages (default: blog)')
+    parser.add_argument('--asset-dir', default=REMOTE_ASSET_DIR,
+                        help=f'content-addressed image cache (default: {REMOTE_ASSET_DIR})')
+    parser.add_argument('--source', metavar='DIR_OR_URL',
+                        help='fetch from a local mirror laid out as <host>/<path> instead of the original hosts')
+    parser.add_argument('--connections', type=int, default=CONNECTIONS, metavar='N',
+                        help=f'concurrent downloads (default: {CONNECTIONS})')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='fetch URLs again that failed on an earlier run')
+    parser.add_argument('--index', default=generate_blog_index.POST_INDEX_PATH,
+                        help='sidecar metadata index to keep in sync '
+                             f'(default: {generate_blog_index.POST_INDEX_PATH})')
+    args = parser.parse_args()
+
+    index = generate_blog_index.load_post_index(args.index)
+    localize_site(args.blog_dir, index, args.source, args.asset_dir, args.connections, args.retry_failed)
+    if index:
+        generate_blog_index.write_post_index(index.values(), args.index)
+
+if __name__ == '__main__':
+    main()
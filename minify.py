@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Minify the generated HTML
+- Collapse whitespace runs outside <pre>, <code>, <textarea>, <script> and <style>
+- Strip comments (conditional comments are kept)
+- Drop duplicate attributes, empty class/style, default script/style types,
+  and repeated declarations inside inline style attributes
+Everything runs as one tokenizer pass per page. blogspot_to_html.py and
+generate_blog_index.py apply it at write time with --minify; this script
+minifies an already generated tree in place: blog.html, search.html and the
+converted posts and category pages in blog/, recognized by their generator
+marker. Hand-maintained pages such as index.html, and posts added to blog/
+by hand, are left alone.
+"""
+
+import argparse
+import re
+from pathlib import Path
+
+import generate_blog_index
+from precompress import iter_site_files
+from render import render_to_string, sync_outputs, write_chunks
+
+# The rest of a tag after its name; quoted values may contain '>'
+TAG_ATTRS = r'(?:"[^"]*"|\'[^\']*\'|[^\'">])*'
+
+# Single-pass tokenizer: comments, raw-text elements (matched whole, so their
+# bodies pass through untouched), start tags and whitespace runs. Text between
+# matches is copied as-is. A removed comment takes its trailing whitespace
+# with it.
+MINIFY_TOKEN_RE = re.compile(
+    r'(?P<comment><!--.*?-->)(?P<comment_space>\s*)'
+    r'|(?P<raw><(?P<raw_name>pre|code|textarea|script|style)\b' + TAG_ATTRS + r'>)'
+    r'(?P<raw_body>.*?)(?P<raw_end></(?P=raw_name)\s*>)'
+    r'|(?P<tag><[a-zA-Z]' + TAG_ATTRS + r'>)'
+    r'|(?P<space>\s+)',
+    re.DOTALL | re.IGNORECASE
+)
+TAG_NAME_RE = re.compile(r'<([^\s/>]+)')
+ATTR_RE = re.compile(r'([^\s"\'>/=]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'=<>`]+))?')
+# A CSS declaration; entities, parentheses and quotes may contain ';'
+DECLARATION_RE = re.compile(r'(?:&#?\w+;|\([^)]*\)|"[^"]*"|\'[^\']*\'|[^;(\'"&]|&)+')
+
+EMPTY_DROPPABLE = {'class', 'style'}
+DEFAULT_TYPES = {('script', 'text/javascript'), ('style', 'text/css')}
+
+def _unquote(value):
+    if value and value[0] in '"\'':
+        return value[1:-1]
+    return value or ''
+
+def minify_style(style):
+    """Drop repeated declarations from an inline style, keeping the one that applies"""
+    declarations = []
+    position = {}
+    for match in DECLARATION_RE.finditer(style):
+        declaration = match.group(0).strip()
+        if ':' not in declaration:
+            continue
+        name, value = declaration.split(':', 1)
+        name = name.strip().lower()
+        declaration = f'{name}:{value.strip()}'
+        important = '!important' in value.lower()
+        if name in position:
+            index = position[name]
+            # A later plain value does not override an earlier !important one
+            if declarations[index][1] and not important:
+                continue
+            declarations[index] = None
+        position[name] = len(declarations)
+        declarations.append((declaration, important))
+    return ';'.join(d[0] for d in declarations if d is not None)
+
+def minify_tag(tag):
+    """Rewrite a start tag with normalized spacing and without redundant attributes"""
+    name = TAG_NAME_RE.match(tag).group(1)
+    body = tag[1 + len(name):-1].rstrip()
+    lower_name = name.lower()
+
+    seen = set()
+    attrs = []
+    end = 0
+    for match in ATTR_RE.finditer(body):
+        end = match.end()
+        attr, value = match.group(1), match.group(2)
+        key = attr.lower()
+        if key in seen:
+            # Browsers keep the first occurrence
+            continue
+        seen.add(key)
+        if key == 'type' and (lower_name, _unquote(value).strip().lower()) in DEFAULT_TYPES:
+            continue
+        if key == 'style' and value is not None:
+            quote = value[0] if value[0] in '"\'' else '"'
+            value = f'{quote}{minify_style(_unquote(value))}{quote}'
+        if key in EMPTY_DROPPABLE and value is not None and not _unquote(value).strip():
+            continue
+        attrs.append(attr if value is None else f'{attr}={value}')
+
+    # A trailing '/' that is not part of an unquoted value
+    self_closing = body.endswith('/') and end < len(body)
+    parts = [name] + attrs
+    return '<' + ' '.join(parts) + ('/>' if self_closing else '>')
+
+def _collapse(space):
+    if not space:
+        return ''
+    return '\n' if '\n' in space else ' '
+
+def _minify_token(match):
+    if match.group('comment') is not None:
+        comment = match.group('comment')
+        space = _collapse(match.group('comment_space'))
+        if comment.startswith('<!--[if'):
+            return comment + space
+        # Whitespace before the comment already stands in for both runs
+        start = match.start()
+        return '' if start and match.string[start - 1].isspace() else space
+    if match.group('raw') is not None:
+        return minify_tag(match.group('raw')) + match.group('raw_body') + match.group('raw_end')
+    if match.group('tag') is not None:
+        return minify_tag(match.group('tag'))
+    return _collapse(match.group('space'))
+
+def minify_html(page):
+    """Minify a full HTML page; running it twice gives the same result"""
+    return MINIFY_TOKEN_RE.sub(_minify_token, page).strip() + '\n'
+
+def write_minified(path, chunks):
+    """Minify rendered chunks and write them to path (if they differ)
+
+    Returns the (original, minified) size in bytes and whether path was written.
+    """
+    page = render_to_string(chunks)
+    minified = minify_html(page)
+    written = write_chunks(path, [minified])
+    return len(page.encode('utf-8')), len(minified.encode('utf-8')), written
+
+def minify_file(path):
+    """Minify an HTML file in place; returns (original, minified) size in bytes"""
+    with open(path, 'r', encoding='utf-8') as f:
+        page = f.read()
+    minified = minify_html(page)
+    if minified != page:
+        write_chunks(path, [minified])
+    return len(page.encode('utf-8')), len(minified.encode('utf-8'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Minify the generated HTML pages in place')
+    parser.add_argument('root', nargs='?', default='.', help='site root (default: current directory)')
+    parser.add_argument('--index', default=generate_blog_index.POST_INDEX_PATH,
+                        help='sidecar metadata index to keep in sync '
+                             f'(default: {generate_blog_index.POST_INDEX_PATH})')
+    args = parser.parse_args()
+
+    root = Path(args.root)
+    index_path = root / args.index
+    index = generate_blog_index.load_post_index(index_path)
+    blog_dir = root / 'blog'
+
+    total_before = total_after = 0
+    for rel_path in iter_site_files(root, {'.html'}):
+        if not generate_blog_index.is_generated_page(rel_path, root):
+            continue
+        path = root / rel_path
+        before, after = generate_blog_index.rewrite_post_file(
+            path, minify_file, index if path.parent == blog_dir else {})
+        total_before += before
+        total_after += after
+        if before != after:
+            print(f"✓ {rel_path}: {before} -> {after} bytes (saved {before - after})")
+
+    sync_outputs()
+    if index:
+        generate_blog_index.write_post_index(index.values(), index_path)
+
+    saved = total_before - total_after
+    percent = 100 * saved / total_before if total_before else 0
+    print(f"\n✓ Saved {saved} bytes across the site ({total_before} -> {total_after}, {percent:.1f}%)")
+
+if __name__ == '__main__':
+    main()
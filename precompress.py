@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Write precompressed siblings for the generated site
+- <file>.gz at level 9 for every HTML/CSS/JS/XML/JSON/TXT/SVG output
+- <file>.br as well when the brotli module is installed
+Files whose hash is unchanged since the last run are skipped, and the work
+runs in a thread pool (zlib and brotli release the GIL while compressing).
+Static hosts and nginx gzip_static/brotli_static can then serve the
+precompressed bytes directly.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import gzip
+import hashlib
+import os
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from render import read_state, write_state
+
+PRECOMPRESS_STATE_PATH = '.build/precompress.json'
+COMPRESSIBLE_SUFFIXES = {'.html', '.css', '.js', '.xml', '.json', '.txt', '.svg'}
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+# What makes up the site: every file under the root except dot-files and
+# dot-directories (.git, .build), the directories and suffixes below, and
+# the Blogspot export (it holds drafts)
+EXCLUDED_DIRS = {'__pycache__', 'templates', 'node_modules', 'venv'}
+SOURCE_SUFFIXES = ('.py', '.pyc', '.md', '.jsonl', '.patch', '.diff', '.tmp', '.part')
+EXCLUDED_FILES = {'benchmark-results.json'}
+BLOGGER_NAMESPACE = b'schemas.google.com/blogger'
+
+def is_blogger_export(path):
+    """True if path is a Blogspot export (sniffed from its first bytes)"""
+    try:
+        with open(path, 'rb') as f:
+            return BLOGGER_NAMESPACE in f.read(4096)
+    except OSError:
+        return False
+
+def is_site_file(rel_path, root='.'):
+    """True if the file at rel_path (relative to root) is part of the site
+
+    A .gz/.br file counts only as the sibling of a site file.
+    """
+    rel_path = Path(rel_path)
+    if any(part.startswith('.') for part in rel_path.parts):
+        return False
+    if any(part in EXCLUDED_DIRS for part in rel_path.parts[:-1]):
+        return False
+    name = rel_path.name
+    if name.endswith(COMPRESSED_SUFFIXES):
+        original = rel_path.with_name(name[:-3])
+        return (Path(root) / original).is_file() and is_site_file(original, root)
+    if name in EXCLUDED_FILES or name.endswith(SOURCE_SUFFIXES):
+        return False
+    return not (name.endswith('.xml') and is_blogger_export(Path(root) / rel_path))
+
+def iter_site_files(root='.', suffixes=None, compressed=False):
+    """Yield the files of the site (see is_site_file), relative to root
+
+    With compressed, the .gz/.br siblings written by this script are
+    included too.
+    """
+    root = Path(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_DIRS and not d.startswith('.'))
+        for name in sorted(filenames):
+            if name.endswith(COMPRESSED_SUFFIXES) and not compressed:
+                continue
+            path = Path(dirpath) / name
+            if suffixes is not None and path.suffix.lower() not in suffixes:
+                continue
+            rel_path = path.relative_to(root)
+            if is_site_file(rel_path, root):
+                yield rel_path
+
+def file_hash(path):
+    """sha256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_state(state_path=PRECOMPRESS_STATE_PATH):
+    """Load {path: hash} recorded by the previous run"""
+    return read_state(state_path, {})
+
+def save_state(state, state_path=PRECOMPRESS_STATE_PATH):
+    """Persist source hashes for the next run"""
+    write_state(state_path, state, ensure_ascii=False, indent=1, sort_keys=True)
+
+def _write_atomic(path, data):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def compress_file(path):
+    """Write path.gz (and path.br when brotli is available); return sizes"""
+    data = path.read_bytes()
+    # mtime=0 keeps the .gz bytes stable for identical input
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    _write_atomic(path.with_name(path.name + '.gz'), gz)
+    sizes = {'raw': len(data), 'gz': len(gz)}
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        _write_atomic(path.with_name(path.name + '.br'), br)
+        sizes['br'] = len(br)
+    return sizes
+
+def _siblings_exist(path):
+    if not path.with_name(path.name + '.gz').exists():
+        return False
+    return brotli is None or path.with_name(path.name + '.br').exists()
+
+def precompress_site(root='.', state_path=PRECOMPRESS_STATE_PATH, workers=None, force=False):
+    """Precompress every changed site file; returns (compressed, skipped)"""
+    root = Path(root)
+    old_state = load_state(state_path) if state_path else {}
+    new_state = {}
+    todo = []
+
+    for rel_path in iter_site_files(root, COMPRESSIBLE_SUFFIXES):
+        path = root / rel_path
+        key = rel_path.as_posix()
+        digest = file_hash(path)
+        new_state[key] = digest
+        if force or old_state.get(key) != digest or not _siblings_exist(path):
+            todo.append(path)
+
+    compressed = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, sizes in zip(todo, executor.map(compress_file, todo)):
+            compressed.append((path, sizes))
+
+    # Siblings of files that are gone would be served stale
+    for key in old_state.keys() - new_state.keys():
+        for suffix in COMPRESSED_SUFFIXES:
+            stale = root / (key + suffix)
+            if stale.exists():
+                stale.unlink()
+
+    if state_path:
+        save_state(new_state, state_path)
+
+    return compressed, len(new_state) - len(todo)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write .gz/.br siblings for the generated site')
+    parser.add_argument('root', nargs='?', default='.', help='site root (default: current directory)')
+    parser.add_argument('--jobs', '-j', type=int, default=None, metavar='N',
+                        help='compression threads (default: Python\'s ThreadPoolExecutor default)')
+    parser.add_argument('--force', action='store_true',
+                        help='recompress every file even if it is unchanged')
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli module not installed; writing .gz only")
+
+    compressed, skipped = precompress_site(args.root, workers=args.jobs, force=args.force)
+    raw = sum(sizes['raw'] for _, sizes in compressed)
+    gz = sum(sizes['gz'] for _, sizes in compressed)
+    for path, sizes in compressed:
+        print(f"✓ {path} ({sizes['raw']} -> {sizes['gz']} gz"
+              + (f", {sizes['br']} br" if 'br' in sizes else '') + ")")
+    print(f"\n✓ Compressed {len(compressed)} files ({raw} -> {gz} bytes gz), {skipped} unchanged")
+
+if __name__ == '__main__':
+    main()
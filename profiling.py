@@ -0,0 +1,183 @@
+"""
+Optional per-stage instrumentation for the build scripts
+- stage(name) records wall time, CPU time, call count and tracemalloc peak
+- record_item(name, seconds) keeps per-post timings for a slowest-N list
+- Results can also be written as a Chrome trace-event JSON file, and the
+  whole run can be wrapped in cProfile
+Everything is off until enable() is called: stage() then hands out a shared
+no-op context manager and record_item() returns at once.
+"""
+
+from contextlib import contextmanager, nullcontext
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+_NULL = nullcontext()
+
+_enabled = False
+_stats = {}    # stage name -> {'calls', 'wall', 'cpu', 'peak'}
+_items = []    # (name, seconds)
+_events = []   # Chrome trace events
+_stack = []    # running peak of the enclosing stages
+_cprofile = None
+
+def enabled():
+    return _enabled
+
+def enable(trace_memory=True):
+    """Start collecting (idempotent; also used in worker processes)"""
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def _record(name, wall, cpu, peak, start, calls=1):
+    entry = _stats.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0})
+    entry['calls'] += calls
+    entry['wall'] += wall
+    entry['cpu'] += cpu
+    entry['peak'] = max(entry['peak'], peak)
+    if start is not None:
+        _events.append({'name': name, 'cat': 'stage', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                        'ts': round(start * 1e6), 'dur': round(wall * 1e6)})
+
+@contextmanager
+def _stage(name):
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Fold the enclosing stage's peak so far into its running maximum
+        if _stack:
+            _stack[-1] = max(_stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    _stack.append(0)
+    # Report stages in the order they start
+    _stats.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'peak': 0})
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        elapsed_wall = time.perf_counter() - wall
+        elapsed_cpu = time.process_time() - cpu
+        peak = _stack.pop()
+        if tracing:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if _stack:
+                _stack[-1] = max(_stack[-1], peak)
+            tracemalloc.reset_peak()
+        _record(name, elapsed_wall, elapsed_cpu, peak, wall)
+
+def stage(name):
+    """Context manager timing a pipeline stage (a no-op unless enabled)"""
+    if not _enabled:
+        return _NULL
+    return _stage(name)
+
+def record_item(name, seconds, start=None):
+    """Remember how long one post took, for the slowest-N report"""
+    if not _enabled:
+        return
+    _items.append((name, seconds))
+    if start is not None:
+        _events.append({'name': name, 'cat': 'post', 'ph': 'X', 'pid': os.getpid(), 'tid': 1,
+                        'ts': round(start * 1e6), 'dur': round(seconds * 1e6)})
+
+def timed_iter(name, iterable):
+    """Count the time spent producing each item of a lazy iterable under stage(name)"""
+    if not _enabled:
+        return iterable
+    return _timed_iter(name, iterable)
+
+def _timed_iter(name, iterable):
+    iterator = iter(iterable)
+    while True:
+        with _stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def materialize(name, chunks):
+    """Render chunks eagerly inside stage(name) so rendering and writing are timed apart
+
+    When profiling is off the chunks are returned untouched and stay lazy.
+    """
+    if not _enabled:
+        return chunks
+    with _stage(name):
+        return list(chunks)
+
+def take():
+    """Hand over and reset what this process collected (for worker processes)"""
+    global _stats, _items, _events
+    collected = {'stats': _stats, 'items': _items, 'events': _events}
+    _stats, _items, _events = {}, [], []
+    return collected
+
+def merge(collected):
+    """Add what a worker process collected"""
+    if not _enabled or not collected:
+        return
+    for name, entry in collected['stats'].items():
+        _record(name, entry['wall'], entry['cpu'], entry['peak'], None, entry['calls'])
+    _items.extend(collected['items'])
+    _events.extend(collected['events'])
+
+def add_arguments(parser):
+    """Add --profile and its options to an argparse parser"""
+    parser.add_argument('--profile', action='store_true',
+                        help='report time, CPU, call counts and memory peak per stage')
+    parser.add_argument('--profile-top', type=int, default=10, metavar='N',
+                        help='with --profile, list the N slowest posts (default: 10)')
+    parser.add_argument('--profile-trace', metavar='PATH',
+                        help='with --profile, write a Chrome trace-event JSON file')
+    parser.add_argument('--profile-cprofile', metavar='PATH',
+                        help='with --profile, also run under cProfile and dump the stats to PATH')
+
+def start(args):
+    """Turn profiling on if the command line asked for it"""
+    global _cprofile
+    if not args.profile:
+        return
+    enable()
+    if args.profile_cprofile:
+        _cprofile = cProfile.Profile()
+        _cprofile.enable()
+
+def finish(args):
+    """Print the report and write the requested files"""
+    global _cprofile
+    if not args.profile:
+        return
+    if _cprofile is not None:
+        _cprofile.disable()
+        _cprofile.dump_stats(args.profile_cprofile)
+        _cprofile = None
+    report(args.profile_top)
+    if args.profile_trace:
+        write_trace(args.profile_trace)
+        print(f"✓ Trace written to {args.profile_trace} (open in chrome://tracing or Perfetto)")
+    if args.profile_cprofile:
+        print(f"✓ cProfile stats written to {args.profile_cprofile}")
+
+def report(top=10):
+    """Print per-stage totals and the slowest posts"""
+    print("\nProfile:")
+    print(f"  {'stage':<24} {'calls':>7} {'wall s':>9} {'cpu s':>9} {'peak MiB':>9}")
+    for name, entry in _stats.items():
+        print(f"  {name:<24} {entry['calls']:>7} {entry['wall']:>9.3f} {entry['cpu']:>9.3f} "
+              f"{entry['peak'] / (1024 * 1024):>9.2f}")
+    if _items and top:
+        print(f"\nSlowest {min(top, len(_items))} posts:")
+        for name, seconds in sorted(_items, key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {seconds * 1000:>9.2f} ms  {name}")
+
+def write_trace(path):
+    """Write the collected events in Chrome trace-event format"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': _events, 'displayTimeUnit': 'ms'}, f)
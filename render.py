@@ -0,0 +1,220 @@
+"""
+Shared rendering helpers for the blog scripts
+Pages are produced as iterables of string chunks and streamed to disk,
+so page size never has to fit in a single growing string.
+Outputs are compared with the file already on disk while they stream and
+only written on a difference, through a temporary file and os.replace(), so
+an interrupted run never leaves a half-written page and a file that already
+holds the same bytes is left alone (its mtime too, which keeps rsync and
+CDN caches warm). fsync is batched: call sync_outputs() once a set of
+outputs is complete, before recording them as built.
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Public address of the site, for feeds and other absolute links
+SITE_URL = 'https://philhelenina.github.io'
+SITE_AUTHOR = 'Cheonkam Jeong'
+
+# The post body of a page rendered from templates/post.html sits between
+# the date paragraph and the first post-meta paragraph
+POST_DATE_OPEN = '<p class="post-date">'
+POST_META_OPEN = '<p class="post-meta">'
+
+def post_body_span(page):
+    """(start, end) of the body HTML of a rendered post page, or None
+
+    Plain str.find calls, so a page without the markers (such as a category
+    page full of post-date paragraphs) costs one linear scan; a single regex
+    spanning both markers backtracks in cubic time there.
+    """
+    start = page.find(POST_DATE_OPEN)
+    if start < 0:
+        return None
+    start = page.find('</p>', start + len(POST_DATE_OPEN))
+    if start < 0:
+        return None
+    start += len('</p>')
+    end = page.find(POST_META_OPEN, start)
+    if end < 0:
+        return None
+    return start, end
+
+def extract_post_body(page):
+    """Return the body HTML of a rendered post page ('' if not found)"""
+    span = post_body_span(page)
+    return page[span[0]:span[1]].strip() if span else ''
+
+def render_to_string(chunks):
+    """Join rendered chunks into a single string"""
+    return ''.join(chunks)
+
+# Outputs replaced since the last sync_outputs()
+_unsynced = set()
+
+def _same_contents(path_a, path_b, block_size=1 << 16):
+    """True if both files exist and hold the same bytes"""
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+            while True:
+                block = a.read(block_size)
+                if block != b.read(block_size):
+                    return False
+                if not block:
+                    return True
+    except FileNotFoundError:
+        return False
+
+def temp_path(path):
+    """Hidden scratch file next to path, private to this process"""
+    path = Path(path)
+    return path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+
+def replace_if_changed(tmp_path, path):
+    """Move tmp_path over path unless the bytes are identical; True if replaced"""
+    if _same_contents(tmp_path, path):
+        os.unlink(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    _unsynced.add(str(path))
+    return True
+
+def _copy_prefix(path, size, out, block_size=1 << 16):
+    """Copy the first size bytes of path to the open file out"""
+    with open(path, 'rb') as f:
+        while size > 0:
+            block = f.read(min(size, block_size))
+            if not block:
+                break
+            out.write(block)
+            size -= len(block)
+
+def write_chunks(path, chunks):
+    """Stream rendered chunks to path atomically, creating parent directories
+
+    The chunks are compared with the current file as they arrive and a
+    temporary file is only opened at the first difference, so an unchanged
+    output costs one read. Returns True if path was written, False if it
+    already held these bytes.
+    """
+    path = Path(path)
+    chunks = iter(chunks)
+    matched, data = 0, b''
+    try:
+        existing = open(path, 'rb')
+    except FileNotFoundError:
+        existing = None
+    if existing is not None:
+        with existing:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                if existing.read(len(data)) != data:
+                    break
+                matched += len(data)
+            else:
+                if not existing.read(1):
+                    return False
+                data = b''
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, 'wb') as f:
+            if matched:
+                # The bytes up to the first difference are already on disk
+                _copy_prefix(path, matched, f)
+            f.write(data)
+            for chunk in chunks:
+                f.write(chunk.encode('utf-8'))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    _unsynced.add(str(path))
+    return True
+
+def add_unsynced(paths):
+    """Queue files written by another process (e.g. a worker) for sync_outputs()"""
+    _unsynced.update(str(path) for path in paths)
+
+def _sync_directory(directory):
+    """fsync a directory, so the renames inside it are durable"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Not every platform or filesystem can sync a directory
+        pass
+    finally:
+        os.close(fd)
+
+def sync_outputs():
+    """fsync every output replaced since the last call, then their directories
+
+    Returns the number of files synced.
+    """
+    paths = sorted(_unsynced)
+    _unsynced.clear()
+    directories = set()
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        directories.add(os.path.dirname(path) or '.')
+    # The renames themselves are only durable once the directory is synced
+    for directory in sorted(directories):
+        _sync_directory(directory)
+    return len(paths)
+
+def read_state(path, default, json_lines=False):
+    """Load build state written by write_state, or default if there is none
+
+    A file that is not valid JSON (cut short by an interrupted run, say)
+    counts as missing, so the build redoes the work instead of crashing.
+    With json_lines, the documents come back as a list.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if json_lines:
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # JSONDecodeError and UnicodeDecodeError are both ValueErrors
+        return default
+
+def write_state(path, data, json_lines=False, **options):
+    """Write build state (under .build/) as JSON, atomically and durably
+
+    options are passed to json.dump; with json_lines, data is an iterable
+    written one JSON document per line. Call it after sync_outputs(), so the
+    state never describes outputs that are not on disk yet.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if json_lines:
+                for item in data:
+                    f.write(json.dumps(item, **options) + '\n')
+            else:
+                json.dump(data, f, **options)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    _sync_directory(path.parent)
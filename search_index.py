@@ -0,0 +1,282 @@
+"""
+Build a static full-text search index for the blog
+- Latin words and numbers are lowercased; Hangul runs become character bigrams
+- Postings are sorted document ids, delta-encoded
+- Terms are spread over a power-of-two number of shards by hash, sized to
+  the vocabulary, so search.html only downloads what a query needs
+- Document titles/URLs are stored in fixed-size pages, fetched for results only
+- The index is only rewritten when a post was added, removed or changed
+- Postings are built one group of shards at a time from a per-post term
+  sidecar (.build/search-terms.jsonl) that is streamed, never loaded whole;
+  only changed posts are tokenized again
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+import tempfile
+import unicodedata
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+
+from render import extract_post_body, sync_outputs, write_chunks, write_state
+
+SEARCH_DIR = 'search'
+TERM_CACHE_PATH = '.build/search-terms.jsonl'
+# Bump when the index or sidecar layout changes so both are rebuilt once
+INDEX_VERSION = 3
+DOCS_PER_SHARD = 100
+# Average terms per shard file; the shard count is the next power of two
+TERMS_PER_SHARD = 1000
+MAX_TERM_SHARDS = 1024
+# Terms hash into TERM_BUCKETS buckets; shard = bucket % shards. Postings are
+# built for one group of buckets (bucket % TERM_GROUPS) at a time, so about
+# 1/TERM_GROUPS of them are in memory at once
+TERM_BUCKETS = MAX_TERM_SHARDS
+TERM_GROUPS = 16
+# Last line of a complete term sidecar
+END_LINE = {'end': True}
+
+TOKEN_RE = re.compile(r'[0-9a-z]+|[가-힣]+')
+
+def is_hangul(char):
+    """Check for a precomposed Hangul syllable"""
+    return '가' <= char <= '힣'
+
+def tokenize(text):
+    """Yield index terms; search.js implements the same rules"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    for run in TOKEN_RE.findall(text):
+        if is_hangul(run[0]):
+            if len(run) == 1:
+                yield run
+            for i in range(len(run) - 1):
+                yield run[i:i + 2]
+        elif len(run) > 1:
+            yield run
+
+def term_shard_count(terms):
+    """Number of term shards for a vocabulary of the given size"""
+    count = 1
+    while count * TERMS_PER_SHARD < terms and count < MAX_TERM_SHARDS:
+        count *= 2
+    return count
+
+def term_hash(term):
+    """32-bit FNV-1a over the term's code points; search.js computes the same"""
+    value = 0x811c9dc5
+    for char in term:
+        value = ((value ^ ord(char)) * 0x01000193) & 0xffffffff
+    return value
+
+def shard_name(term, shards):
+    """Shard file (without .json) that holds a term"""
+    return str(term_hash(term) % shards)
+
+def extract_post_text(filepath):
+    """Plain text of a generated post: title plus body"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    title_match = re.search(r'<h1>(.*?)</h1>', content, re.DOTALL)
+    parts = [title_match.group(1) if title_match else '', extract_post_body(content)]
+    text = re.sub(r'<[^>]+>', ' ', ' '.join(parts))
+    return html.unescape(text)
+
+def file_signature(filepath):
+    """[mtime_ns, size] of a post page"""
+    stat = filepath.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+def post_term_groups(filepath):
+    """Distinct terms of a post as {group: [terms]}"""
+    groups = {}
+    for term in sorted(set(tokenize(extract_post_text(filepath)))):
+        groups.setdefault(term_hash(term) % TERM_BUCKETS % TERM_GROUPS, []).append(term)
+    return groups
+
+class CorruptTermCache(Exception):
+    """The term sidecar could not be read back"""
+
+def _read_lines(f):
+    """Yield the JSON documents of an open sidecar, one per line"""
+    try:
+        for line in f:
+            yield json.loads(line)
+    except ValueError as e:
+        raise CorruptTermCache(str(e)) from None
+
+def read_cache_header(cache_path):
+    """First line of the term sidecar ({} if missing, corrupt or outdated)
+
+    {'version', 'index': signature of the index on disk, 'posts': count}; the
+    sidecar continues with one {'filename', 'sig'} line per post, then,
+    group by group, one {'filename', 'group', 'terms'} line per post, and
+    ends with END_LINE.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except (FileNotFoundError, ValueError):
+        return {}
+    return header if header.get('version') == INDEX_VERSION else {}
+
+def delta_encode(ids):
+    """[3, 7, 12] -> [3, 4, 5]"""
+    previous = 0
+    encoded = []
+    for doc_id in ids:
+        encoded.append(doc_id - previous)
+        previous = doc_id
+    return encoded
+
+def _write_json_if_changed(path, data):
+    """Write compact JSON unless the file already holds exactly that"""
+    return write_chunks(path, [json.dumps(data, ensure_ascii=False, separators=(',', ':'))])
+
+def index_signature(all_posts, blog_path, out_path):
+    """Hash of what the index is built from: the posts, in order, and their files"""
+    payload = json.dumps([INDEX_VERSION, out_path.as_posix(), DOCS_PER_SHARD, TERMS_PER_SHARD] + [
+        [post['filename'], post['title'], post['date'], file_signature(blog_path / post['filename'])]
+        for post in all_posts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _write_term_shards(postings, term_shards, out_path, names):
+    """Write the term shards holding postings ({term: (bucket, [doc ids])})
+
+    Adds their names to names; returns the number of files written.
+    """
+    shards = {}
+    for term, (bucket, ids) in postings.items():
+        ids.sort()
+        shards.setdefault(f'terms/{bucket % term_shards}.json', {})[term] = delta_encode(ids)
+    names.update(shards)
+    return sum(_write_json_if_changed(out_path / name, dict(sorted(terms.items())))
+               for name, terms in sorted(shards.items()))
+
+def _group_records(group, pending, old_lines, keep, spill):
+    """Yield the sidecar lines of a group: kept old ones, then new ones
+
+    pending is a one-item list holding the next unread old line.
+    """
+    while pending[0] is not None and pending[0].get('group') == group:
+        if pending[0]['filename'] in keep:
+            yield pending[0]
+        pending[0] = next(old_lines, None)
+    if spill is not None:
+        spill.seek(0)
+        yield from _read_lines(spill)
+
+def _index_records(all_posts, blog_path, out_path, signature, cached, old_lines, stack, result):
+    """Write the index; yields the new term sidecar, one document at a time
+
+    cached maps filenames to the signatures the old sidecar (old_lines,
+    positioned after its post lines) holds terms for; without one, old_lines
+    only holds END_LINE. result gets the
+    number of files written and in the index.
+    """
+    doc_ids = {post['filename']: doc_id for doc_id, post in enumerate(all_posts)}
+    signatures = {name: file_signature(blog_path / name) for name in doc_ids}
+
+    # Tokenize new and changed posts, spilling their terms group by group
+    keep = {name for name, sig in signatures.items() if cached.get(name) == sig}
+    spills = {}
+    for name in signatures:
+        if name in keep:
+            continue
+        for group, terms in post_term_groups(blog_path / name).items():
+            if group not in spills:
+                spills[group] = stack.enter_context(tempfile.TemporaryFile('w+', encoding='utf-8'))
+            spills[group].write(json.dumps({'filename': name, 'group': group, 'terms': terms},
+                                           ensure_ascii=False) + '\n')
+
+    yield {'version': INDEX_VERSION, 'index': signature, 'posts': len(signatures)}
+    for name, sig in signatures.items():
+        yield {'filename': name, 'sig': sig}
+
+    docs = [[post['title'], f"{blog_path.as_posix()}/{post['filename']}", post['date']]
+            for post in all_posts]
+    names = {'meta.json'}
+    written = 0
+    for start in range(0, len(docs), DOCS_PER_SHARD):
+        name = f'docs/{start // DOCS_PER_SHARD}.json'
+        names.add(name)
+        written += _write_json_if_changed(out_path / name, docs[start:start + DOCS_PER_SHARD])
+
+    pending = [next(old_lines, None)]
+    postings = {}
+    term_shards = None
+    for group in range(TERM_GROUPS):
+        for record in _group_records(group, pending, old_lines, keep, spills.get(group)):
+            yield record
+            doc_id = doc_ids[record['filename']]
+            for term in record['terms']:
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (term_hash(term) % TERM_BUCKETS, [])
+                entry[1].append(doc_id)
+
+        if term_shards is None:
+            # Size the shards from the first group's share of the vocabulary
+            term_shards = term_shard_count(TERM_GROUPS * len(postings))
+        if term_shards >= TERM_GROUPS:
+            # Every shard of this group is complete
+            written += _write_term_shards(postings, term_shards, out_path, names)
+            postings = {}
+    written += _write_term_shards(postings, term_shards, out_path, names)
+    if pending[0] != END_LINE:
+        raise CorruptTermCache('term sidecar is incomplete')
+    yield END_LINE
+
+    meta = {'docs': len(docs), 'docs_per_shard': DOCS_PER_SHARD, 'term_shards': term_shards}
+    written += _write_json_if_changed(out_path / 'meta.json', meta)
+
+    # Remove shards that are no longer used
+    for stale in list(out_path.glob('docs/*.json')) + list(out_path.glob('terms/*.json')):
+        if stale.relative_to(out_path).as_posix() not in names:
+            stale.unlink()
+    sync_outputs()
+    result.extend([written, len(names)])
+
+def _build_index(all_posts, blog_path, out_path, signature, cache_path):
+    """Rebuild the index, reusing the terms of unchanged posts from the sidecar"""
+    result = []
+    with ExitStack() as stack:
+        cached = {}
+        old_lines = iter((END_LINE,))
+        if cache_path and read_cache_header(cache_path):
+            f = stack.enter_context(open(cache_path, 'r', encoding='utf-8'))
+            old_lines = _read_lines(f)
+            header = next(old_lines)
+            for _ in range(header['posts']):
+                line = next(old_lines)
+                cached[line['filename']] = line['sig']
+        records = _index_records(all_posts, blog_path, out_path, signature, cached, old_lines, stack, result)
+        if cache_path:
+            write_state(cache_path, records, json_lines=True, ensure_ascii=False, separators=(',', ':'))
+        else:
+            deque(records, maxlen=0)
+    return tuple(result)
+
+def build_search_index(all_posts, blog_dir='blog', out_dir=SEARCH_DIR,
+                       cache_path=TERM_CACHE_PATH):
+    """Write the sharded index for all_posts (newest first = lowest doc id)
+
+    Nothing is read or written if the posts are the ones the index on disk
+    was built from. Returns (number of files written, number of files in
+    the index).
+    """
+    blog_path = Path(blog_dir)
+    out_path = Path(out_dir)
+    signature = index_signature(all_posts, blog_path, out_path)
+    if (cache_path and read_cache_header(cache_path).get('index') == signature
+            and (out_path / 'meta.json').exists()):
+        return 0, 1 + sum(1 for _ in out_path.glob('docs/*.json')) + sum(1 for _ in out_path.glob('terms/*.json'))
+    try:
+        return _build_index(all_posts, blog_path, out_path, signature, cache_path)
+    except (CorruptTermCache, KeyError, StopIteration):
+        # A sidecar cut short counts as missing: tokenize every post again
+        os.unlink(cache_path)
+        return _build_index(all_posts, blog_path, out_path, signature, cache_path)
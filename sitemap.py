@@ -0,0 +1,155 @@
+"""
+sitemap.xml generation
+URLs are streamed straight into the XML files; past MAX_URLS (or MAX_BYTES)
+per file the output is split into sitemap-N.xml parts and sitemap.xml
+becomes a sitemap index pointing at them.
+Hand-maintained pages get a lastmod tied to their content, not their mtime,
+so a fresh checkout does not change it.
+"""
+
+from datetime import datetime, timezone
+import os
+import subprocess
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from feeds import site_url
+from precompress import file_hash
+from render import read_state, replace_if_changed, sync_outputs, write_state
+
+SITEMAP_PATH = 'sitemap.xml'
+# {page: {'hash', 'lastmod'}} for hand-maintained pages
+LASTMOD_STATE_PATH = '.build/lastmod.json'
+MAX_URLS = 50000
+# Protocol limit is 50 MiB uncompressed; keep some headroom for the footer
+MAX_BYTES = 50 * 1024 * 1024 - 1024
+
+URLSET_OPEN = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+URLSET_CLOSE = '</urlset>\n'
+
+def format_lastmod(value):
+    """ISO timestamp or datetime -> W3C datetime with seconds precision"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+
+def file_lastmod(path):
+    """Last-modified time of a file on disk"""
+    return datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+def git_lastmod(path):
+    """Time of the last commit touching path, if the file is that version (else None)"""
+    try:
+        if subprocess.run(['git', 'status', '--porcelain', '--', path],
+                          capture_output=True, text=True, check=True).stdout:
+            # Modified or untracked
+            return None
+        stamp = subprocess.run(['git', 'log', '-1', '--format=%cI', '--', path],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return stamp or None
+
+def page_lastmod(path, state_path=LASTMOD_STATE_PATH):
+    """lastmod of a hand-maintained page, which only moves when its content does
+
+    Content seen before keeps the lastmod recorded for it. New content gets
+    its commit time if it is committed, otherwise the current time.
+    """
+    digest = file_hash(path)
+    state = read_state(state_path, {})
+    entry = state.get(path)
+    if entry and entry['hash'] == digest:
+        return entry['lastmod']
+    lastmod = git_lastmod(path) or format_lastmod(datetime.now(timezone.utc))
+    state[path] = {'hash': digest, 'lastmod': lastmod}
+    write_state(state_path, state, indent=1, sort_keys=True)
+    return lastmod
+
+class _PartWriter:
+    """Streams <url> entries into numbered sitemap parts"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.parts = []
+        self.file = None
+
+    def _open(self):
+        path = self.directory / f'sitemap-{len(self.parts) + 1}.xml'
+        self.parts.append(path)
+        self.file = open(path.with_suffix('.xml.tmp'), 'w', encoding='utf-8')
+        self.file.write(URLSET_OPEN)
+        self.urls = 0
+        self.bytes = len(URLSET_OPEN)
+
+    def _close(self):
+        self.file.write(URLSET_CLOSE)
+        self.file.close()
+        self.file = None
+
+    def add(self, loc, lastmod):
+        entry = f'  <url><loc>{escape(loc)}</loc>'
+        if lastmod is not None:
+            entry += f'<lastmod>{format_lastmod(lastmod)}</lastmod>'
+        entry += '</url>\n'
+        size = len(entry.encode('utf-8'))
+
+        if self.file is not None and (self.urls >= MAX_URLS or self.bytes + size > MAX_BYTES):
+            self._close()
+        if self.file is None:
+            self._open()
+        self.file.write(entry)
+        self.urls += 1
+        self.bytes += size
+
+    def finish(self):
+        if self.file is None:
+            self._open()
+        self._close()
+        return self.parts
+
+def write_sitemap(entries, path=SITEMAP_PATH):
+    """Write the sitemap for (site-relative path, lastmod) entries
+
+    Returns the list of files that were (re)written.
+    """
+    path = Path(path)
+    directory = path.parent
+    writer = _PartWriter(directory)
+    for page, lastmod in entries:
+        writer.add(site_url(page), lastmod)
+    parts = writer.finish()
+
+    written = []
+    if len(parts) == 1:
+        # Small site: the only part is the sitemap itself
+        if replace_if_changed(parts[0].with_suffix('.xml.tmp'), path):
+            written.append(path)
+        parts = []
+    else:
+        for part in parts:
+            if replace_if_changed(part.with_suffix('.xml.tmp'), part):
+                written.append(part)
+        tmp_path = path.with_suffix('.xml.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+            for part in parts:
+                f.write(f'  <sitemap><loc>{escape(site_url(part.relative_to(directory).as_posix()))}</loc>'
+                        f'<lastmod>{format_lastmod(file_lastmod(part))}</lastmod></sitemap>\n')
+            f.write('</sitemapindex>\n')
+        if replace_if_changed(tmp_path, path):
+            written.append(path)
+
+    sync_outputs()
+
+    # Drop parts left over from a larger site
+    live = set(parts)
+    for stale in directory.glob('sitemap-*.xml'):
+        if stale not in live:
+            stale.unlink()
+
+    return written
@@ -0,0 +1,260 @@
+"""
+Minimal template engine for the blog pages
+- {{ name }} / {{ post.title }} substitute escaped values, {{ name|safe }} inserts raw HTML
+- {{ labels|join }} joins a list with ", " before escaping
+- {% extends "base.html" %} with {% block name %}...{% endblock %} for layouts
+- {% include "partials/nav.html" %} for partials
+- {% for post in posts %}...{% endfor %} and {% if name %}...{% else %}...{% endif %}
+Block tags on their own line do not leave blank lines behind.
+Templates are compiled once per process into flat segment lists and cached.
+"""
+
+from collections import ChainMap
+import hashlib
+import html
+import re
+from pathlib import Path
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+
+# A {% tag %} also swallows indentation before it (when it starts a line)
+# and the newline after it, like Jinja's trim_blocks/lstrip_blocks
+TOKEN_RE = re.compile(r'(?P<indent>[ \t]*)\{%\s*(?P<tag>.*?)\s*%\}(?P<newline>\n?)'
+                      r'|\{\{\s*(?P<expr>.*?)\s*\}\}', re.DOTALL)
+
+_cache = {}
+
+class TemplateError(Exception):
+    """Raised for malformed templates"""
+
+def _split_expr(expr):
+    """Split 'post.title|safe' into (('post', 'title'), ['safe'])"""
+    name, *filters = [part.strip() for part in expr.split('|')]
+    return tuple(name.split('.')), filters
+
+def _tokenize(source):
+    """Yield ('text', str), ('tag', str) and ('var', str) tokens"""
+    pos = 0
+    for match in TOKEN_RE.finditer(source):
+        text = source[pos:match.start()]
+        if match.group('tag') is not None:
+            indent = match.group('indent')
+            at_line_start = match.start() == 0 or source[match.start() - 1] == '\n'
+            if not at_line_start:
+                text += indent
+            if text:
+                yield 'text', text
+            yield 'tag', match.group('tag')
+        else:
+            text += match.group('indent') or ''
+            if text:
+                yield 'text', text
+            yield 'var', match.group('expr')
+        pos = match.end()
+    if pos < len(source):
+        yield 'text', source[pos:]
+
+def _parse(source, name):
+    """Parse template source into a node tree and the name of its parent layout"""
+    root = []
+    stack = [('root', None, root)]
+    parent = None
+
+    for kind, value in _tokenize(source):
+        nodes = stack[-1][2]
+        if kind == 'text':
+            nodes.append(('text', value))
+            continue
+        if kind == 'var':
+            path, filters = _split_expr(value)
+            nodes.append(('var', path, filters))
+            continue
+
+        words = value.split()
+        keyword = words[0] if words else ''
+        if keyword == 'extends':
+            parent = value[len('extends'):].strip().strip('"\'')
+        elif keyword == 'include':
+            nodes.append(('include', value[len('include'):].strip().strip('"\'')))
+        elif keyword in ('block', 'if') and len(words) != 2:
+            # Easy to hit mid-edit under build.py serve
+            raise TemplateError(f"{name}: expected '{{% {keyword} name %}}', got '{value}'")
+        elif keyword == 'block':
+            body = []
+            nodes.append(('block', words[1], body))
+            stack.append(('block', words[1], body))
+        elif keyword == 'for':
+            if len(words) != 4 or words[2] != 'in':
+                raise TemplateError(f"{name}: expected '{{% for x in items %}}', got '{value}'")
+            body = []
+            nodes.append(('for', words[1], _split_expr(words[3])[0], body))
+            stack.append(('for', None, body))
+        elif keyword == 'if':
+            body, else_body = [], []
+            nodes.append(('if', _split_expr(words[1])[0], body, else_body))
+            stack.append(('if', else_body, body))
+        elif keyword == 'else':
+            opened, else_body, _ = stack.pop()
+            if opened != 'if':
+                raise TemplateError(f"{name}: '{{% else %}}' outside of an if block")
+            stack.append(('else', None, else_body))
+        elif keyword in ('endblock', 'endfor', 'endif'):
+            opened = stack.pop()[0]
+            expected = {'endblock': ('block',), 'endfor': ('for',), 'endif': ('if', 'else')}[keyword]
+            if opened not in expected:
+                raise TemplateError(f"{name}: unexpected '{{% {keyword} %}}'")
+        else:
+            raise TemplateError(f"{name}: unknown tag '{value}'")
+
+    if len(stack) != 1:
+        raise TemplateError(f"{name}: unclosed '{{% {stack[-1][0]} %}}'")
+    return root, parent
+
+def _collect_blocks(nodes, blocks):
+    """Map block name to body for every block in a node tree"""
+    for node in nodes:
+        if node[0] == 'block':
+            blocks.setdefault(node[1], node[2])
+            _collect_blocks(node[2], blocks)
+        elif node[0] == 'for':
+            _collect_blocks(node[3], blocks)
+        elif node[0] == 'if':
+            _collect_blocks(node[2], blocks)
+            _collect_blocks(node[3], blocks)
+    return blocks
+
+def _resolve(nodes, blocks, including):
+    """Substitute blocks and inline includes, merging adjacent text"""
+    out = []
+
+    def emit(node):
+        if node[0] == 'text' and out and out[-1][0] == 'text':
+            out[-1] = ('text', out[-1][1] + node[1])
+        else:
+            out.append(node)
+
+    for node in nodes:
+        kind = node[0]
+        if kind == 'block':
+            for child in _resolve(blocks.get(node[1], node[2]), blocks, including):
+                emit(child)
+        elif kind == 'include':
+            if node[1] in including:
+                raise TemplateError(f"recursive include of '{node[1]}'")
+            for child in _compile(node[1], including | {node[1]}):
+                emit(child)
+        elif kind == 'for':
+            emit(('for', node[1], node[2], _resolve(node[3], blocks, including)))
+        elif kind == 'if':
+            emit(('if', node[1], _resolve(node[2], blocks, including),
+                  _resolve(node[3], blocks, including)))
+        else:
+            emit(node)
+    return out
+
+def _compile(name, including=frozenset()):
+    """Compile a template (and its layouts and partials) to flat segments"""
+    source = (TEMPLATE_DIR / name).read_text(encoding='utf-8')
+    nodes, parent = _parse(source, name)
+
+    blocks = _collect_blocks(nodes, {})
+    seen = {name}
+    while parent is not None:
+        if parent in seen:
+            raise TemplateError(f"circular extends involving '{parent}'")
+        seen.add(parent)
+        nodes, grandparent = _parse((TEMPLATE_DIR / parent).read_text(encoding='utf-8'), parent)
+        # Child blocks win over the layout's defaults
+        for block_name, body in _collect_blocks(nodes, {}).items():
+            blocks.setdefault(block_name, body)
+        parent = grandparent
+
+    return _resolve(nodes, blocks, including | {name})
+
+def _lookup(context, path):
+    """Resolve a dotted name against the context (missing names are None)"""
+    value = context.get(path[0])
+    for part in path[1:]:
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(part)
+        else:
+            value = getattr(value, part, None)
+    return value
+
+def _render_nodes(nodes, context):
+    """Yield rendered chunks for precompiled nodes"""
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            yield node[1]
+        elif kind == 'var':
+            value = _lookup(context, node[1])
+            filters = node[2]
+            if 'join' in filters:
+                value = ', '.join(str(item) for item in value or ())
+            if value is None:
+                continue
+            yield str(value) if 'safe' in filters else html.escape(str(value))
+        elif kind == 'for':
+            for item in _lookup(context, node[2]) or ():
+                yield from _render_nodes(node[3], ChainMap({node[1]: item}, context))
+        elif kind == 'if':
+            branch = node[2] if _lookup(context, node[1]) else node[3]
+            yield from _render_nodes(branch, context)
+
+class Template:
+    """A compiled template"""
+
+    def __init__(self, name, nodes):
+        self.name = name
+        self.nodes = nodes
+
+    def render(self, context):
+        """Yield the rendered template in chunks"""
+        return _render_nodes(self.nodes, ChainMap(context))
+
+    def render_string(self, context):
+        """Render the template to a single string"""
+        return ''.join(self.render(context))
+
+def get_template(name):
+    """Return the compiled template, compiling it on first use"""
+    template = _cache.get(name)
+    if template is None:
+        template = _cache[name] = Template(name, _compile(name))
+    return template
+
+def load_templates():
+    """Compile every page template up front (e.g. before forking workers)"""
+    for path in sorted(TEMPLATE_DIR.glob('*.html')):
+        get_template(path.name)
+    return _cache
+
+def clear_templates():
+    """Forget compiled templates so edited sources are picked up"""
+    _cache.clear()
+
+def template_dependencies(name):
+    """Template files name is built from: itself, its layouts and partials"""
+    found = set()
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        if current in found:
+            continue
+        found.add(current)
+        for kind, value in _tokenize((TEMPLATE_DIR / current).read_text(encoding='utf-8')):
+            words = value.split() if kind == 'tag' else ()
+            if words and words[0] in ('extends', 'include'):
+                pending.append(value[len(words[0]):].strip().strip('"\''))
+    return found
+
+def templates_fingerprint():
+    """Hash of all template sources, to invalidate outputs when they change"""
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATE_DIR.rglob('*.html')):
+        digest.update(path.relative_to(TEMPLATE_DIR).as_posix().encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()